@@ -2,7 +2,8 @@ from flask import Flask
 from flask_migrate import Migrate
 from .models import db
 from .utils.currency import usd_to_cad
-from .views import customers, providers, orders, costs, ads, expenses, main, products, accounts, reports, utilities
+from .utils.report_cache import init_report_cache
+from .views import customers, providers, orders, costs, ads, expenses, main, products, accounts, reports, utilities, search
 
 
 def create_app(config_class="config.Config"):
@@ -12,6 +13,7 @@ def create_app(config_class="config.Config"):
     # Initialize extensions
     db.init_app(app)
     Migrate(app, db)
+    init_report_cache(app)
 
     # Register blueprints
     app.register_blueprint(main.bp)  # ← Top page
@@ -25,6 +27,7 @@ def create_app(config_class="config.Config"):
     app.register_blueprint(accounts.bp,    url_prefix="/accounts")
     app.register_blueprint(reports.bp,    url_prefix="/reports")
     app.register_blueprint(utilities.bp,   url_prefix="/utilities")
+    app.register_blueprint(search.bp,      url_prefix="/search")
 
     app.add_template_global(usd_to_cad, name='usd_to_cad')
 
@@ -65,6 +65,11 @@ class ExchangeRate(db.Model):
 
     currency = db.relationship('Currency', back_populates='exchange_rates')
 
+    # serves the nearest-date rate lookups done inside report queries
+    __table_args__ = (
+        db.Index('ix_exchange_rates_currency_code_date', 'currency_code', 'date'),
+    )
+
 
 class Account(db.Model):
     __tablename__ = 'accounts'
@@ -80,6 +85,17 @@ class Account(db.Model):
     parent = db.relationship('Account', remote_side=[id], backref='children')
 
 
+class AccountClosure(db.Model):
+    """
+    Every (ancestor, descendant) pair of the account tree, including each
+    account paired with itself at depth 0. Maintained by app.utils.account_tree.
+    """
+    __tablename__ = 'account_closure'
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), primary_key=True, index=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+
 class Product(db.Model):
     __tablename__ = 'products'
     id = db.Column(db.Integer, primary_key=True)
@@ -114,11 +130,19 @@ class Order(db.Model):
         nullable=False,
         default='na'
     )
+    # total_amount converted to CAD at import time, with the rate that was applied
+    amount_cad = db.Column(db.Numeric(12, 2), nullable=True)
+    rate_used = db.Column(db.Numeric(18, 8), nullable=True)
 
 
     customer = db.relationship('Customer', back_populates='orders')
     items = db.relationship('OrderItem', back_populates='order', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # serves date range filters and the (order_date, id) keyset of the orders list
+        db.Index('ix_orders_order_date_id', 'order_date', 'id'),
+    )
+
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
@@ -132,6 +156,8 @@ class OrderItem(db.Model):
     subtotal = db.Column(db.Numeric(12, 2), nullable=False)
     currency_code = db.Column(db.String(3), db.ForeignKey('currencies.code'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    amount_cad = db.Column(db.Numeric(12, 2), nullable=True)  # subtotal in CAD
+    rate_used = db.Column(db.Numeric(18, 8), nullable=True)
 
     order = db.relationship('Order', back_populates='items')
     product = db.relationship('Product', back_populates='items')
@@ -143,11 +169,13 @@ class ExpenseInvoice(db.Model):
     __tablename__ = 'expense_invoices'
     id = db.Column(db.Integer, primary_key=True)
     provider_id = db.Column(db.Integer, db.ForeignKey('providers.id'), nullable=False)
-    invoice_date = db.Column(db.Date, nullable=False)
+    invoice_date = db.Column(db.Date, nullable=False, index=True)
     invoice_number = db.Column(db.String(64))
     supplier_invoice = db.Column(db.String(64))
     total_amount = db.Column(db.Numeric(12, 2), nullable=False)
     notes = db.Column(db.Text)
+    amount_cad = db.Column(db.Numeric(12, 2), nullable=True)  # total_amount in CAD
+    rate_used = db.Column(db.Numeric(18, 8), nullable=True)
 
     provider = db.relationship('Provider', back_populates='expense_invoices')
     items = db.relationship('ExpenseItem', back_populates='invoice', cascade='all, delete-orphan')
@@ -173,7 +201,9 @@ class ExpenseItem(db.Model):
     description = db.Column(db.String(256))
     amount = db.Column(db.Numeric(12, 2), nullable=False)
     currency_code = db.Column(db.String(3), db.ForeignKey('currencies.code'), nullable=False)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=True, index=True)
+    amount_cad = db.Column(db.Numeric(12, 2), nullable=True)  # amount in CAD
+    rate_used = db.Column(db.Numeric(18, 8), nullable=True)
 
     invoice = db.relationship('ExpenseInvoice', back_populates='items')
     account = db.relationship('Account')
@@ -204,3 +234,83 @@ class ExpenseTemplateItem(db.Model):
     order = db.Column(db.Integer, nullable=False)
     template = db.relationship('ExpenseTemplate', back_populates='items')
     account = db.relationship('Account')
+
+
+class DailyAccountTotal(db.Model):
+    """Per account, day and currency totals of the ledger, kept up to date by the write paths."""
+    __tablename__ = 'daily_account_totals'
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    currency_code = db.Column(db.String(3), db.ForeignKey('currencies.code'), nullable=False)
+    amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    amount_cad = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    account = db.relationship('Account')
+
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'day', 'currency_code', name='uq_daily_account_totals_account_day_currency'),
+    )
+
+
+class DataVersion(db.Model):
+    """Single-row counter bumped by every write that changes report data; cached reports are keyed by it."""
+    __tablename__ = 'data_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AccountBalanceSnapshot(db.Model):
+    """Closing CAD balance of an account at the end of a month, built from the daily account totals."""
+    __tablename__ = 'account_balance_snapshots'
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    period_end = db.Column(db.Date, nullable=False, index=True)
+    balance_cad = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+    account = db.relationship('Account')
+
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'period_end', name='uq_account_balance_snapshots_account_period'),
+    )
+
+
+class ClosedPeriod(db.Model):
+    """A closed month: its totals are frozen and writes dated inside it are refused."""
+    __tablename__ = 'closed_periods'
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.Date, nullable=False, unique=True)
+    closed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class FrozenAccountTotal(db.Model):
+    """Daily account totals of a closed month, moved out of daily_account_totals when it was closed."""
+    __tablename__ = 'frozen_account_totals'
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.Date, nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    currency_code = db.Column(db.String(3), db.ForeignKey('currencies.code'), nullable=False)
+    amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    amount_cad = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    account = db.relationship('Account')
+
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'day', 'currency_code', name='uq_frozen_account_totals_account_day_currency'),
+    )
+
+
+class CustomerStats(db.Model):
+    """Per-customer order aggregates, refreshed for the customers an import touches."""
+    __tablename__ = 'customer_stats'
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    first_order_date = db.Column(db.Date, nullable=True, index=True)
+    last_order_date = db.Column(db.Date, nullable=True)
+    amount_spent = db.Column(db.Numeric(14, 2), nullable=False, default=0)  # sum of order totals
+    amount_spent_cad = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+    customer = db.relationship('Customer', backref=db.backref('stats', uselist=False))
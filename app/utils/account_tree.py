@@ -0,0 +1,104 @@
+from sqlalchemy import delete, event, insert, inspect, literal, select, true, union_all
+from sqlalchemy.orm import aliased
+
+from ..models import db, Account, AccountClosure
+
+closure = AccountClosure.__table__
+
+
+def subtree_ids(account_id) -> list[int]:
+    """Ids of an account and all of its descendants."""
+    return [
+        row.descendant_id
+        for row in db.session.query(AccountClosure.descendant_id)
+        .filter(AccountClosure.ancestor_id == account_id)
+    ]
+
+
+def ancestors(account_id) -> list[Account]:
+    """The account's ancestors, root first (the account itself excluded)."""
+    return (
+        Account.query
+        .join(AccountClosure, AccountClosure.ancestor_id == Account.id)
+        .filter(AccountClosure.descendant_id == account_id, AccountClosure.depth > 0)
+        .order_by(AccountClosure.depth.desc())
+        .all()
+    )
+
+
+def set_parent(account, parent_id):
+    """
+    Move `account` under `parent_id` (None makes it a root). The closure
+    rows follow through the update listener below.
+    Raises ValueError if the new parent is the account itself or one of its
+    descendants.
+    """
+    if parent_id is not None and account.id is not None and parent_id in subtree_ids(account.id):
+        raise ValueError(f"'{account.name}' cannot be moved under itself or one of its sub-accounts.")
+    account.parent_id = parent_id
+
+
+def rebuild_account_closure() -> int:
+    """Recompute the closure table from accounts.parent_id with a recursive CTE. Does not commit."""
+    tree = (
+        select(Account.id.label('ancestor_id'), Account.id.label('descendant_id'), literal(0).label('depth'))
+        .cte('tree', recursive=True)
+    )
+    child = aliased(Account)
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, child.id, tree.c.depth + 1)
+        .join(child, child.parent_id == tree.c.descendant_id)
+    )
+    db.session.execute(delete(closure))
+    result = db.session.execute(
+        insert(closure).from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)
+        )
+    )
+    return result.rowcount
+
+
+@event.listens_for(Account, 'after_insert')
+def _account_inserted(mapper, connection, target):
+    # the new account is its own depth-0 ancestor and one level below each
+    # ancestor of its parent
+    rows = select(literal(target.id), literal(target.id), literal(0))
+    if target.parent_id is not None:
+        rows = union_all(
+            rows,
+            select(closure.c.ancestor_id, literal(target.id), closure.c.depth + 1)
+            .where(closure.c.descendant_id == target.parent_id)
+        )
+    connection.execute(insert(closure).from_select(['ancestor_id', 'descendant_id', 'depth'], rows))
+
+
+@event.listens_for(Account, 'after_update')
+def _account_updated(mapper, connection, target):
+    history = inspect(target).attrs.parent_id.history
+    if not history.has_changes():
+        return
+
+    subtree = select(closure.c.descendant_id).where(closure.c.ancestor_id == target.id)
+    old_ancestors = select(closure.c.ancestor_id).where(
+        closure.c.descendant_id == target.id, closure.c.ancestor_id != target.id
+    )
+    # 1) detach the subtree from its old ancestors
+    connection.execute(
+        delete(closure).where(
+            closure.c.descendant_id.in_(subtree),
+            closure.c.ancestor_id.in_(old_ancestors)
+        )
+    )
+    # 2) attach it below every ancestor of the new parent
+    if target.parent_id is not None:
+        above = closure.alias('above')
+        below = closure.alias('below')
+        connection.execute(
+            insert(closure).from_select(
+                ['ancestor_id', 'descendant_id', 'depth'],
+                select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+                .select_from(above.join(below, true()))
+                .where(above.c.descendant_id == target.parent_id, below.c.ancestor_id == target.id)
+            )
+        )
@@ -0,0 +1,109 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, insert
+
+from ..models import db, AccountBalanceSnapshot
+from .date_buckets import period_bucket
+from .periods import month_end, totals_source
+
+
+def _next_month_end(day: date) -> date:
+    return month_end(month_end(day) + timedelta(days=1))
+
+
+def _latest_snapshot(on_or_before=None):
+    """(period_end, {account_id: balance_cad}) of the latest snapshot, or (None, {})."""
+    q = db.session.query(func.max(AccountBalanceSnapshot.period_end))
+    if on_or_before is not None:
+        q = q.filter(AccountBalanceSnapshot.period_end <= on_or_before)
+    period_end = q.scalar()
+    if period_end is None:
+        return None, {}
+    rows = (
+        db.session.query(AccountBalanceSnapshot.account_id, AccountBalanceSnapshot.balance_cad)
+        .filter(AccountBalanceSnapshot.period_end == period_end)
+        .all()
+    )
+    return period_end, dict(rows)
+
+
+def build_snapshots(through=None) -> int:
+    """
+    Extend the monthly balance snapshots up to the month end of `through`
+    (by default the last completed month), starting after the latest stored
+    snapshot. Every account with history gets a row for every month end.
+    Does not commit. Returns the number of snapshot rows written.
+    """
+    if through is None:
+        through = date.today().replace(day=1) - timedelta(days=1)
+    through = month_end(through)
+    if through >= date.today():
+        # the running month is still moving; only snapshot closed months
+        through = date.today().replace(day=1) - timedelta(days=1)
+
+    last, balances = _latest_snapshot()
+    totals = totals_source()
+    month = period_bucket(totals.c.day, 'month')
+    q = (
+        db.session.query(month, totals.c.account_id, func.sum(totals.c.amount_cad))
+        .filter(totals.c.day <= through)
+        .group_by(month, totals.c.account_id)
+    )
+    if last is not None:
+        q = q.filter(totals.c.day > last)
+    deltas = {}
+    for month_key, account_id, amount in q:
+        deltas.setdefault(month_key, {})[account_id] = amount or Decimal('0')
+
+    if last is not None:
+        period_end = _next_month_end(last)
+    elif deltas:
+        year, mon = map(int, min(deltas).split('-'))
+        period_end = month_end(date(year, mon, 1))
+    else:
+        return 0
+
+    rows = []
+    while period_end <= through:
+        for account_id, amount in deltas.get(period_end.strftime('%Y-%m'), {}).items():
+            balances[account_id] = balances.get(account_id, Decimal('0')) + amount
+        rows.extend(
+            {'account_id': account_id, 'period_end': period_end, 'balance_cad': balance}
+            for account_id, balance in balances.items()
+        )
+        period_end = _next_month_end(period_end)
+
+    for idx in range(0, len(rows), 1000):
+        db.session.execute(insert(AccountBalanceSnapshot), rows[idx:idx + 1000])
+    return len(rows)
+
+
+def refresh_snapshots(from_day: date) -> int:
+    """
+    Drop the snapshots a change on `from_day` made stale (every month end on
+    or after it) and build them again. Does not commit.
+    """
+    AccountBalanceSnapshot.query.filter(
+        AccountBalanceSnapshot.period_end >= from_day
+    ).delete(synchronize_session=False)
+    return build_snapshots()
+
+
+def balances_as_of(as_of: date) -> dict:
+    """
+    {account_id: CAD balance} at the end of `as_of`: the latest snapshot on
+    or before that day plus the daily totals (live or frozen) booked after it.
+    """
+    period_end, balances = _latest_snapshot(as_of)
+    totals = totals_source()
+    q = (
+        db.session.query(totals.c.account_id, func.sum(totals.c.amount_cad))
+        .filter(totals.c.day <= as_of)
+        .group_by(totals.c.account_id)
+    )
+    if period_end is not None:
+        q = q.filter(totals.c.day > period_end)
+    for account_id, amount in q:
+        balances[account_id] = balances.get(account_id, Decimal('0')) + (amount or Decimal('0'))
+    return balances
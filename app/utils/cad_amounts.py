@@ -0,0 +1,163 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+import requests
+from sqlalchemy import Numeric, case, func, literal, select, type_coerce, update
+from sqlalchemy.orm import aliased
+
+from ..models import db, Order, OrderItem, ExpenseInvoice, ExpenseItem, ExchangeRate, Provider
+from .currency import get_rate, prefetch_rates
+
+BATCH_SIZE = 1000
+
+
+def cad_rate(currency_code, on_date) -> Decimal:
+    """Rate that turns an amount in `currency_code` into CAD (1 for CAD itself)."""
+    if currency_code == 'CAD':
+        return Decimal('1')
+    return get_rate(on_date, currency_code or 'USD')
+
+
+def cad_fields(amount, currency_code, on_date) -> dict:
+    """
+    Values for the materialized `amount_cad` / `rate_used` columns of a row,
+    ready to pass as keyword arguments to the model constructor.
+    Both stay None when no rate can be resolved (nothing stored, no API key
+    or the provider unreachable): reads then convert on the fly and
+    `flask recompute-cad` fills them in later.
+    """
+    if amount is None or on_date is None:
+        return {'amount_cad': None, 'rate_used': None}
+    try:
+        rate = cad_rate(currency_code, on_date)
+    except (ValueError, requests.exceptions.RequestException):
+        return {'amount_cad': None, 'rate_used': None}
+    return {
+        'amount_cad': (Decimal(amount) * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        'rate_used': rate,
+    }
+
+
+def apply_cad(obj, amount, currency_code, on_date):
+    """Set amount_cad / rate_used on an existing row after its amount changed."""
+    for key, value in cad_fields(amount, currency_code, on_date).items():
+        setattr(obj, key, value)
+
+
+def _sources(start=None, end=None):
+    """(model, query of id/amount/currency/date) for every table with CAD columns."""
+    order_items = (
+        db.session.query(OrderItem.id, OrderItem.subtotal, OrderItem.currency_code, Order.order_date)
+        .join(Order, OrderItem.order_id == Order.id)
+    )
+    orders = (
+        db.session.query(
+            Order.id,
+            Order.total_amount,
+            func.coalesce(func.max(OrderItem.currency_code), 'USD'),
+            Order.order_date
+        )
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .group_by(Order.id)
+    )
+    expense_items = (
+        db.session.query(ExpenseItem.id, ExpenseItem.amount, ExpenseItem.currency_code,
+                         ExpenseInvoice.invoice_date)
+        .join(ExpenseInvoice, ExpenseItem.expense_invoice_id == ExpenseInvoice.id)
+    )
+    expense_invoices = (
+        db.session.query(ExpenseInvoice.id, ExpenseInvoice.total_amount, Provider.currency_code,
+                         ExpenseInvoice.invoice_date)
+        .join(Provider, ExpenseInvoice.provider_id == Provider.id)
+    )
+    if start and end:
+        order_items = order_items.filter(Order.order_date.between(start, end))
+        orders = orders.filter(Order.order_date.between(start, end))
+        expense_items = expense_items.filter(ExpenseInvoice.invoice_date.between(start, end))
+        expense_invoices = expense_invoices.filter(ExpenseInvoice.invoice_date.between(start, end))
+    return [
+        (OrderItem, order_items),
+        (Order, orders),
+        (ExpenseItem, expense_items),
+        (ExpenseInvoice, expense_invoices),
+    ]
+
+
+def recompute_cad_amounts(start=None, end=None) -> dict:
+    """
+    Recalculate amount_cad / rate_used for every order, order item, expense
+    invoice and expense item (optionally limited to a date range), e.g. after
+    exchange rates were added or corrected.
+    Rates are resolved with one prefetch per table and rows are written back
+    with batched bulk UPDATEs. Returns {table name: rows updated}.
+    """
+    counts = {}
+    for model, query in _sources(start, end):
+        rows = query.all()
+
+        dates_by_currency = defaultdict(set)
+        for _, _, currency_code, on_date in rows:
+            if currency_code != 'CAD':
+                dates_by_currency[currency_code or 'USD'].add(on_date)
+        for currency_code, dates in dates_by_currency.items():
+            prefetch_rates(dates, currency_code)
+
+        mappings = [
+            {'id': row_id, **cad_fields(amount, currency_code, on_date)}
+            for row_id, amount, currency_code, on_date in rows
+        ]
+        for idx in range(0, len(mappings), BATCH_SIZE):
+            db.session.execute(update(model), mappings[idx:idx + BATCH_SIZE])
+        db.session.commit()
+        counts[model.__tablename__] = len(mappings)
+    return counts
+
+
+def sql_order_currency():
+    """Currency of an order as a correlated subquery: the one of its line items, USD when it has none."""
+    return func.coalesce(
+        select(func.max(OrderItem.currency_code))
+        .where(OrderItem.order_id == Order.id)
+        .correlate(Order)
+        .scalar_subquery(),
+        'USD'
+    )
+
+
+def sql_rate(currency_col, date_col):
+    """
+    SQL expression for the CAD rate of `currency_col` on `date_col`: 1 for CAD,
+    otherwise the exchange_rates row on or nearest before that date, falling
+    back to the nearest later one when nothing earlier is stored.
+    """
+    er = aliased(ExchangeRate)
+    prior = (
+        select(er.rate)
+        .where(er.currency_code == currency_col, er.date <= date_col)
+        .order_by(er.date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    later = (
+        select(er.rate)
+        .where(er.currency_code == currency_col, er.date > date_col)
+        .order_by(er.date.asc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return case(
+        (currency_col == 'CAD', literal(1)),
+        else_=func.coalesce(prior, later)
+    )
+
+
+def sql_cad_amount(amount_col, currency_col, date_col, materialized_col=None):
+    """
+    SQL expression for an amount in CAD, rounded per row like the materialized
+    columns. Uses `materialized_col` when it is filled and converts in the
+    database otherwise; NULL only when no rate at all is stored.
+    """
+    converted = func.round(amount_col * sql_rate(currency_col, date_col), 2)
+    if materialized_col is not None:
+        converted = func.coalesce(materialized_col, converted)
+    return type_coerce(converted, Numeric(12, 2))
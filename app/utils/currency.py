@@ -1,83 +1,348 @@
 import os
+import threading
 import time
+from bisect import bisect_right
 
 import requests
 from datetime import date as _date, datetime as _datetime
 from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import event, insert
+
 from ..models import db, ExchangeRate
+from .lru import LRUCache
 
 API_KEY = os.getenv("OPEN_EXCHANGE_API") or os.getenv("EXCHANGERATE_HOST_KEY")
 
+# A date without its own stored rate borrows the nearest earlier one when the
+# gap is at most this many days (covers weekends and long weekends).
+RATE_GAP_TOLERANCE_DAYS = int(os.getenv("RATE_GAP_TOLERANCE_DAYS", "4"))
+# How long the in-memory date index (and every rate resolved from it) is
+# trusted before it is reloaded, so rates stored by other workers are picked up.
+RATE_INDEX_TTL = int(os.getenv("RATE_INDEX_TTL", "300"))
+
+# Process-wide cache of resolved rates keyed by (currency_code, date). A date
+# resolved through the gap tolerance or a fallback may get its own rate later,
+# so entries expire with the index.
+RATE_CACHE_SIZE = int(os.getenv("RATE_CACHE_SIZE", "4096"))
+_rate_cache = LRUCache(RATE_CACHE_SIZE, ttl=RATE_INDEX_TTL)
+
 def _normalize_date(on_date: _date | _datetime) -> _date:
     if isinstance(on_date, _datetime):
         return on_date.date()
     return on_date
 
-def usd_to_cad(amount: Decimal, on_date: _date | _datetime) -> Decimal:
+
+class _RateIndex:
     """
-    Convert a USD amount into CAD for the given date (or datetime).
-    - First tries to load a stored ExchangeRate (currency_code='USD') for the date.
-    - If none exists, fetches from Open Exchange Rates and stores it for that date.
-    - If the provider doesn't have a rate for that specific date, fall back to the
-      provider's latest (end-of-day-style) rate.
-    Returns a Decimal rounded to 2 places.
+    Sorted in-memory copy of the exchange_rates table, one list per currency,
+    so the nearest stored rate for any date is a bisect away.
+    """
+
+    def __init__(self):
+        self._dates = {}
+        self._rates = {}
+        self._loaded_at = {}
+        # re-entrant: loading can autoflush a new rate, whose insert event
+        # invalidates the index from inside the lock
+        self._lock = threading.RLock()
+
+    def _series(self, currency_code):
+        with self._lock:
+            loaded_at = self._loaded_at.get(currency_code)
+            if loaded_at is None or time.monotonic() - loaded_at > RATE_INDEX_TTL:
+                rows = (
+                    db.session.query(ExchangeRate.date, ExchangeRate.rate)
+                    .filter(ExchangeRate.currency_code == currency_code)
+                    .order_by(ExchangeRate.date)
+                    .all()
+                )
+                by_day = {day: Decimal(rate) for day, rate in rows}
+                self._dates[currency_code] = sorted(by_day)
+                self._rates[currency_code] = [by_day[d] for d in self._dates[currency_code]]
+                self._loaded_at[currency_code] = time.monotonic()
+            return self._dates[currency_code], self._rates[currency_code]
+
+    def on_or_before(self, on_day, currency_code):
+        """(date, rate) of the latest stored rate on or before on_day, or None."""
+        dates, rates = self._series(currency_code)
+        pos = bisect_right(dates, on_day)
+        if pos == 0:
+            return None
+        return dates[pos - 1], rates[pos - 1]
+
+    def after(self, on_day, currency_code):
+        """(date, rate) of the earliest stored rate after on_day, or None."""
+        dates, rates = self._series(currency_code)
+        pos = bisect_right(dates, on_day)
+        if pos == len(dates):
+            return None
+        return dates[pos], rates[pos]
+
+    def invalidate(self, currency_code=None):
+        with self._lock:
+            if currency_code is None:
+                self._loaded_at.clear()
+            else:
+                self._loaded_at.pop(currency_code, None)
+
+
+_rate_index = _RateIndex()
+
+
+def rate_cache_stats() -> dict:
+    """Hit/miss counters and current size of the exchange-rate cache."""
+    return _rate_cache.stats()
+
+
+def clear_rate_cache():
+    _rate_cache.clear()
+    _rate_index.invalidate()
+
+
+@event.listens_for(ExchangeRate, 'after_insert')
+@event.listens_for(ExchangeRate, 'after_update')
+@event.listens_for(ExchangeRate, 'after_delete')
+def _rate_changed(mapper, connection, target):
+    # a new or changed row can shift the nearest-prior resolution of many
+    # cached dates, so drop everything and reload the index on next use
+    clear_rate_cache()
+
+
+def _holds_sqlite_write_lock() -> bool:
+    """True when the session has uncommitted writes on SQLite, whose lock keeps other connections from writing."""
+    if db.engine.dialect.name != 'sqlite' or db.session().get_transaction() is None:
+        return False
+    return db.session.connection().connection.dbapi_connection.in_transaction
+
+
+def _store_rates(currency_code, rates: dict):
+    """
+    Persist fetched {date: rate} rows without committing the caller's
+    session: they go through their own short transaction, so a write the
+    caller has in progress is neither committed early nor able to take the
+    rates down with it. If the session already holds SQLite's write lock a
+    second connection cannot write, so the rows are flushed into the
+    caller's transaction instead and land with its commit.
+    """
+    if not rates:
+        return
+    rows = [{'currency_code': currency_code, 'date': day, 'rate': rate} for day, rate in rates.items()]
+    if _holds_sqlite_write_lock():
+        db.session.execute(insert(ExchangeRate), rows)
+    else:
+        with db.engine.begin() as conn:
+            conn.execute(insert(ExchangeRate.__table__), rows)
+    # Core inserts skip the ORM events that normally reset the cache
+    clear_rate_cache()
+
+
+def _resolve_offline(on_day: _date, currency_code: str, tolerance_days: int):
+    """Nearest earlier stored rate within the tolerance, or None."""
+    found = _rate_index.on_or_before(on_day, currency_code)
+    if found and (on_day - found[0]).days <= tolerance_days:
+        return found[1]
+    return None
+
+
+def get_rate(on_date: _date | _datetime, currency_code: str = 'USD',
+             tolerance_days: int | None = None) -> Decimal:
+    """
+    Return the CAD rate for `currency_code` on the given date.
+    - Served from the in-process cache when possible.
+    - Otherwise resolved against the in-memory date index: an exact match, or the
+      nearest earlier rate when it is at most `tolerance_days` old
+      (RATE_GAP_TOLERANCE_DAYS by default).
+    - Larger gaps fetch the historical rate from Open Exchange Rates and store it.
+    - If that fails, the nearest stored rate (earlier, then later) is used, and
+      only as a last resort the provider's latest rate; neither is stored
+      against the requested date.
     """
     on_day = _normalize_date(on_date)
-    # 1) Look for a saved rate
-    rate_obj = ExchangeRate.query.filter_by(currency_code='USD', date=on_day).first()
-    if not rate_obj:
+    if tolerance_days is None:
+        tolerance_days = RATE_GAP_TOLERANCE_DAYS
+    key = (currency_code, on_day)
+    rate = _rate_cache.get(key)
+    if rate is not None:
+        return rate
+
+    rate = _resolve_offline(on_day, currency_code, tolerance_days)
+    if rate is None and currency_code == 'USD' and API_KEY:
+        rate = _fetch_usd_rate(on_day)
+    if rate is None:
+        found = (_rate_index.on_or_before(on_day, currency_code)
+                 or _rate_index.after(on_day, currency_code))
+        if found:
+            rate = found[1]
+    if rate is None:
+        if currency_code != 'USD':
+            raise ValueError(f"No stored {currency_code} rate for {on_day}")
         if not API_KEY:
             raise ValueError("Missing OPEN_EXCHANGE_API key")
+        rate = _fetch_usd_latest()
 
-        # 2) Fetch from Open Exchange Rates with retry logic
-        url = f"https://openexchangerates.org/api/historical/{on_day.isoformat()}.json"
-        params = {"app_id": API_KEY, "symbols": "CAD"}
-
-        max_retries = 3
-        raw_rate = None
-        for attempt in range(max_retries):
-            try:
-                resp = requests.get(url, params=params, timeout=10)
-                resp.raise_for_status()
-                data = resp.json()
-                if data.get("error"):
-                    raw_rate = None
-                    break
-                raw_rate = data.get("rates", {}).get("CAD")
-                if raw_rate is None:
-                    raise ValueError(f"No CAD rate returned for {on_day}")
-                break
-            except requests.exceptions.HTTPError as e:
-                if e.response is not None and e.response.status_code == 429:
-                    if attempt < max_retries - 1:
-                        wait_time = (2 ** attempt) + 1
-                        time.sleep(wait_time)
-                        continue
-                raw_rate = None
-                break
+    _rate_cache.put(key, rate)
+    return rate
+
+
+def prefetch_rates(dates, currency_code: str = 'USD') -> dict:
+    """
+    Resolve rates for a batch of dates up front so later conversions are cache hits.
+    - Dates already cached are skipped.
+    - Everything else is resolved offline against the in-memory date index
+      (one query to load it, none once it is warm).
+    - Dates whose gap exceeds the tolerance are fetched from Open Exchange Rates
+      in one time-series batch (per month of span) and stored together,
+      without committing the caller's session (see _store_rates).
+    Returns {date: rate} for every date that could be resolved.
+    """
+    days = {_normalize_date(d) for d in dates if d is not None}
+    rates = {}
+    missing = set()
+    for day in days:
+        rate = _rate_cache.get((currency_code, day))
+        if rate is None:
+            rate = _resolve_offline(day, currency_code, RATE_GAP_TOLERANCE_DAYS)
+            if rate is not None:
+                _rate_cache.put((currency_code, day), rate)
+        if rate is None:
+            missing.add(day)
+        else:
+            rates[day] = rate
+
+    if missing and currency_code == 'USD' and API_KEY:
+        fetched = _fetch_usd_time_series(sorted(missing))
+        _store_rates('USD', fetched)
+        for day, rate in fetched.items():
+            rates[day] = rate
+            _rate_cache.put(('USD', day), rate)
+
+    return rates
+
+
+def convert_many(amounts, dates, currency_code: str = 'USD') -> list[Decimal]:
+    """
+    Convert parallel sequences of amounts and dates into CAD.
+    All rates are resolved with one prefetch; dates the batch could not resolve
+    fall back to the per-date lookup in get_rate().
+    """
+    amounts = list(amounts)
+    days = [_normalize_date(d) for d in dates]
+    if currency_code == 'CAD':
+        return amounts
+
+    rates = prefetch_rates(days, currency_code)
+    converted = []
+    for amt, day in zip(amounts, days):
+        rate = rates.get(day)
+        if rate is None:
+            rate = get_rate(day, currency_code)
+        converted.append((amt * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+    return converted
 
-        # 2b) Fall back to latest if historical is unavailable
-        if raw_rate is None:
+
+def _fetch_usd_time_series(days: list[_date]) -> dict:
+    """
+    Fetch USD->CAD rates for many days using the time-series endpoint,
+    one request per month-sized window. Windows that fail are skipped and
+    left for the per-date historical lookup.
+    """
+    wanted = set(days)
+    fetched = {}
+    idx = 0
+    while idx < len(days):
+        window_start = days[idx]
+        while idx < len(days) and (days[idx] - window_start).days < 31:
+            idx += 1
+        window_end = days[idx - 1]
+        try:
             resp = requests.get(
-                "https://openexchangerates.org/api/latest.json",
-                params=params,
+                "https://openexchangerates.org/api/time-series.json",
+                params={
+                    "app_id": API_KEY,
+                    "symbols": "CAD",
+                    "start": window_start.isoformat(),
+                    "end": window_end.isoformat(),
+                },
                 timeout=10
             )
             resp.raise_for_status()
             data = resp.json()
+        except (requests.exceptions.RequestException, ValueError):
+            continue
+        if data.get("error"):
+            continue
+        for day_str, day_rates in (data.get("rates") or {}).items():
+            day = _date.fromisoformat(day_str)
+            raw_rate = (day_rates or {}).get("CAD")
+            if day in wanted and raw_rate is not None:
+                fetched[day] = Decimal(str(raw_rate))
+    return fetched
+
+
+def _fetch_usd_rate(on_day: _date) -> Decimal | None:
+    """
+    Fetch the USD->CAD rate for a day from Open Exchange Rates and store it.
+    Returns None if the provider has no rate for that specific date.
+    """
+    url = f"https://openexchangerates.org/api/historical/{on_day.isoformat()}.json"
+    params = {"app_id": API_KEY, "symbols": "CAD"}
+
+    max_retries = 3
+    raw_rate = None
+    for attempt in range(max_retries):
+        try:
+            resp = requests.get(url, params=params, timeout=10)
+            resp.raise_for_status()
+            data = resp.json()
+            if data.get("error"):
+                raw_rate = None
+                break
             raw_rate = data.get("rates", {}).get("CAD")
-            if raw_rate is None:
-                raise ValueError("No CAD rate returned from latest endpoint")
-
-        # 3) Persist it
-        rate_obj = ExchangeRate(
-            currency_code='USD',
-            date=on_day,
-            rate=Decimal(str(raw_rate))
-        )
-        db.session.add(rate_obj)
-        db.session.commit()
-
-    # 4) Compute and return
-    cad = (amount * rate_obj.rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            break
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 429:
+                if attempt < max_retries - 1:
+                    wait_time = (2 ** attempt) + 1
+                    time.sleep(wait_time)
+                    continue
+            raw_rate = None
+            break
+        except requests.exceptions.RequestException:
+            raw_rate = None
+            break
+
+    if raw_rate is None:
+        return None
+
+    # Persist it
+    rate = Decimal(str(raw_rate))
+    _store_rates('USD', {on_day: rate})
+    return rate
+
+
+def _fetch_usd_latest() -> Decimal:
+    """Provider's latest USD->CAD rate. Never stored against a historical date."""
+    resp = requests.get(
+        "https://openexchangerates.org/api/latest.json",
+        params={"app_id": API_KEY, "symbols": "CAD"},
+        timeout=10
+    )
+    resp.raise_for_status()
+    raw_rate = resp.json().get("rates", {}).get("CAD")
+    if raw_rate is None:
+        raise ValueError("No CAD rate returned from latest endpoint")
+    return Decimal(str(raw_rate))
+
+
+def usd_to_cad(amount: Decimal, on_date: _date | _datetime) -> Decimal:
+    """
+    Convert a USD amount into CAD for the given date (or datetime).
+    The rate comes from get_rate(): cached or stored rates first (including the
+    nearest earlier business-day rate within RATE_GAP_TOLERANCE_DAYS), and only
+    for larger gaps from Open Exchange Rates.
+    Returns a Decimal rounded to 2 places.
+    """
+    rate = get_rate(on_date, 'USD')
+    cad = (amount * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
     return cad
@@ -0,0 +1,79 @@
+from sqlalchemy import case, delete, func, insert, select
+
+from ..models import db, CustomerStats, Order
+from .cad_amounts import sql_cad_amount, sql_order_currency
+from .date_buckets import period_bucket
+
+BATCH_SIZE = 500
+
+STATS_COLUMNS = [
+    'customer_id', 'order_count', 'first_order_date', 'last_order_date',
+    'amount_spent', 'amount_spent_cad',
+]
+
+
+def _aggregate():
+    """
+    Per-customer aggregate of the orders table, in STATS_COLUMNS order.
+    Orders whose CAD amount is not materialized yet are converted in SQL.
+    """
+    return (
+        select(
+            Order.customer_id,
+            func.count(Order.id),
+            func.min(Order.order_date),
+            func.max(Order.order_date),
+            func.coalesce(func.sum(Order.total_amount), 0),
+            func.coalesce(func.sum(
+                sql_cad_amount(Order.total_amount, sql_order_currency(), Order.order_date, Order.amount_cad)
+            ), 0)
+        )
+        .group_by(Order.customer_id)
+    )
+
+
+def refresh_customer_stats(customer_ids):
+    """
+    Recompute the stats rows of the given customers from their own orders.
+    Called by the order import with the customers it added orders for.
+    Does not commit; the caller's commit makes it part of the same write.
+    """
+    customer_ids = sorted({cid for cid in customer_ids if cid is not None})
+    for idx in range(0, len(customer_ids), BATCH_SIZE):
+        chunk = customer_ids[idx:idx + BATCH_SIZE]
+        db.session.execute(delete(CustomerStats).where(CustomerStats.customer_id.in_(chunk)))
+        db.session.execute(
+            insert(CustomerStats).from_select(
+                STATS_COLUMNS, _aggregate().where(Order.customer_id.in_(chunk))
+            )
+        )
+
+
+def rebuild_customer_stats() -> int:
+    """Recompute the whole customer_stats table from the orders. Commits; returns the row count."""
+    db.session.execute(delete(CustomerStats))
+    count = db.session.execute(insert(CustomerStats).from_select(STATS_COLUMNS, _aggregate())).rowcount
+    db.session.commit()
+    return count
+
+
+def cohort_rows():
+    """
+    One row per first-order month: customers acquired, how many came back
+    for a second order, their orders and lifetime revenue (CAD).
+    Read from customer_stats only, so it never scans the orders table.
+    """
+    cohort = period_bucket(CustomerStats.first_order_date, 'month')
+    return (
+        db.session.query(
+            cohort.label('cohort'),
+            func.count().label('customers'),
+            func.sum(case((CustomerStats.order_count > 1, 1), else_=0)).label('repeat_customers'),
+            func.sum(CustomerStats.order_count).label('orders'),
+            func.sum(CustomerStats.amount_spent_cad).label('revenue_cad')
+        )
+        .filter(CustomerStats.first_order_date.isnot(None))
+        .group_by(cohort)
+        .order_by(cohort)
+        .all()
+    )
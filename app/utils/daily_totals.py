@@ -0,0 +1,108 @@
+import requests
+from sqlalchemy import func, insert
+
+from ..models import db, AccountBalanceSnapshot, DailyAccountTotal
+from .balances import build_snapshots, refresh_snapshots
+from .currency import prefetch_rates, usd_to_cad
+from .data_version import bump_data_version
+from .ledger import ledger_query
+from .periods import closed_months, is_closed, totals_source
+
+BATCH_SIZE = 500
+
+
+def _aggregate(ledger) -> list[dict]:
+    """Group ledger rows per account, day and currency into DailyAccountTotal rows."""
+    rows = (
+        db.session.query(
+            ledger.c.account_id,
+            ledger.c.date,
+            ledger.c.currency_code,
+            func.sum(ledger.c.amount).label('amount'),
+            func.sum(ledger.c.amount_cad).label('amount_cad'),
+            func.count().label('count'),
+            (func.count() - func.count(ledger.c.amount_cad)).label('unresolved')
+        )
+        .group_by(ledger.c.account_id, ledger.c.date, ledger.c.currency_code)
+        .all()
+    )
+    # a group only lacks a CAD amount when no rate at all is stored for it
+    prefetch_rates(row.date for row in rows if row.unresolved and row.currency_code != 'CAD')
+
+    totals = []
+    for row in rows:
+        amount_cad = row.amount_cad
+        if row.unresolved and row.currency_code == 'CAD':
+            amount_cad = row.amount
+        elif row.unresolved:
+            try:
+                amount_cad = usd_to_cad(row.amount, row.date)
+            except (ValueError, requests.exceptions.RequestException):
+                # no rate to be had yet: keep what did convert, so the write
+                # goes through; `flask recompute-cad` rebuilds the day later
+                amount_cad = row.amount_cad or 0
+        totals.append({
+            'account_id': row.account_id,
+            'day': row.date,
+            'currency_code': row.currency_code,
+            'amount': row.amount,
+            'amount_cad': amount_cad,
+            'count': row.count,
+        })
+    return totals
+
+
+def _insert(totals):
+    for idx in range(0, len(totals), BATCH_SIZE):
+        db.session.execute(insert(DailyAccountTotal), totals[idx:idx + BATCH_SIZE])
+
+
+def refresh_daily_totals(days):
+    """
+    Re-aggregate the daily totals for the given days from the order and
+    expense items, then rebuild the balance snapshots from the earliest of
+    them on. Called by every write path with the dates it touched, so the
+    cost follows the size of the change, not of the history. Days inside a
+    closed period are skipped: their totals are frozen.
+    Does not commit; the caller's commit makes it part of the same write.
+    """
+    closed = closed_months()
+    days = sorted({day for day in days if day is not None and not is_closed(day, closed)})
+    for idx in range(0, len(days), BATCH_SIZE):
+        chunk = days[idx:idx + BATCH_SIZE]
+        totals = _aggregate(ledger_query(days=chunk))
+        DailyAccountTotal.query.filter(DailyAccountTotal.day.in_(chunk)).delete(synchronize_session=False)
+        _insert(totals)
+    if days:
+        refresh_snapshots(days[0])
+
+
+def rebuild_daily_totals() -> int:
+    """
+    Recompute the whole daily_account_totals table, and the balance snapshots
+    built on it, from scratch. Closed periods keep their frozen totals.
+    Returns the daily totals row count.
+    """
+    closed = closed_months()
+    totals = [row for row in _aggregate(ledger_query()) if not is_closed(row['day'], closed)]
+    DailyAccountTotal.query.delete(synchronize_session=False)
+    _insert(totals)
+    AccountBalanceSnapshot.query.delete(synchronize_session=False)
+    build_snapshots()
+    bump_data_version()
+    db.session.commit()
+    return len(totals)
+
+
+def account_totals(start=None, end=None, account_ids=None) -> dict:
+    """{account_id: (amount, amount_cad)} summed from the daily totals, optionally for a date range."""
+    t = totals_source()
+    q = (
+        db.session.query(t.c.account_id, func.sum(t.c.amount), func.sum(t.c.amount_cad))
+        .group_by(t.c.account_id)
+    )
+    if start and end:
+        q = q.filter(t.c.day.between(start, end))
+    if account_ids is not None:
+        q = q.filter(t.c.account_id.in_(account_ids))
+    return {account_id: (amount, amount_cad) for account_id, amount, amount_cad in q}
@@ -0,0 +1,22 @@
+from sqlalchemy import update
+
+from ..models import db, DataVersion
+
+
+def current_data_version() -> int:
+    """Current value of the global data-version counter (0 before the first write)."""
+    version = db.session.query(DataVersion.version).filter(DataVersion.id == 1).scalar()
+    return version or 0
+
+
+def bump_data_version():
+    """
+    Increment the data-version counter so every cached report built from the
+    old data is ignored. Does not commit; the bump becomes visible together
+    with the write that caused it.
+    """
+    result = db.session.execute(
+        update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1)
+    )
+    if not result.rowcount:
+        db.session.add(DataVersion(id=1, version=1))
@@ -0,0 +1,82 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import String
+
+
+class day_bucket(FunctionElement):
+    """A date formatted 'YYYY-MM-DD', matching the daily P&L column keys."""
+    type = String()
+    name = 'day_bucket'
+    inherit_cache = True
+
+
+class week_start(FunctionElement):
+    """
+    The Monday of the week a date falls in, formatted 'YYYY-MM-DD' so it
+    matches the weekly P&L column keys. Compiled per database dialect.
+    """
+    type = String()
+    name = 'week_start'
+    inherit_cache = True
+
+
+class month_bucket(FunctionElement):
+    """The month a date falls in, formatted 'YYYY-MM', matching the monthly P&L column keys."""
+    type = String()
+    name = 'month_bucket'
+    inherit_cache = True
+
+
+BUCKETS = {
+    'day': day_bucket,
+    'week': week_start,
+    'month': month_bucket,
+}
+
+
+def period_bucket(column, granularity):
+    """
+    Bucket a date column by 'day', 'week' or 'month' (unknown values fall
+    back to days). The bucket is only ever selected and grouped on; range
+    filters should compare the bare column so they can use its index.
+    """
+    return BUCKETS.get(granularity, day_bucket)(column)
+
+
+def _column(element, compiler, **kw):
+    return compiler.process(list(element.clauses)[0], **kw)
+
+
+# SQLite (and the default for other dialects)
+
+@compiles(day_bucket)
+def _day_bucket_sqlite(element, compiler, **kw):
+    return f"strftime('%Y-%m-%d', {_column(element, compiler, **kw)})"
+
+
+@compiles(week_start)
+def _week_start_sqlite(element, compiler, **kw):
+    # 'weekday 0' moves forward to the next Sunday (or stays on one)
+    return f"date({_column(element, compiler, **kw)}, 'weekday 0', '-6 days')"
+
+
+@compiles(month_bucket)
+def _month_bucket_sqlite(element, compiler, **kw):
+    return f"strftime('%Y-%m', {_column(element, compiler, **kw)})"
+
+
+# PostgreSQL
+
+@compiles(day_bucket, 'postgresql')
+def _day_bucket_postgresql(element, compiler, **kw):
+    return f"to_char(date_trunc('day', {_column(element, compiler, **kw)}), 'YYYY-MM-DD')"
+
+
+@compiles(week_start, 'postgresql')
+def _week_start_postgresql(element, compiler, **kw):
+    return f"to_char(date_trunc('week', {_column(element, compiler, **kw)}), 'YYYY-MM-DD')"
+
+
+@compiles(month_bucket, 'postgresql')
+def _month_bucket_postgresql(element, compiler, **kw):
+    return f"to_char(date_trunc('month', {_column(element, compiler, **kw)}), 'YYYY-MM')"
@@ -0,0 +1,141 @@
+import json
+import os
+import re
+import time
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from flask import current_app
+
+DEFAULT_TTL = 86400
+
+_FILE_KEY = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _upload_dir() -> str:
+    upload_dir = os.path.join(current_app.root_path, 'uploads')
+    os.makedirs(upload_dir, exist_ok=True)
+    return upload_dir
+
+
+def _ttl() -> int:
+    return current_app.config.get('IMPORT_SESSION_TTL', DEFAULT_TTL)
+
+
+def _staged_path(file_key):
+    """Path of a session's staged file, or None if `file_key` is not one we handed out."""
+    if not file_key or not _FILE_KEY.match(file_key):
+        return None
+    return os.path.join(_upload_dir(), f"{file_key}.staged")
+
+
+def purge_expired(max_age=None) -> int:
+    """
+    Delete every file in the uploads folder older than `max_age` seconds
+    (IMPORT_SESSION_TTL by default): abandoned sessions and leftover CSVs.
+    Dotfiles such as .gitkeep are left alone. Returns the number of files
+    removed.
+    """
+    cutoff = time.time() - (_ttl() if max_age is None else max_age)
+    removed = 0
+    for entry in os.scandir(_upload_dir()):
+        try:
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # another worker got there first
+    return removed
+
+
+def save_upload(uploaded) -> tuple[str, str]:
+    """
+    Start an import session for an uploaded CSV: purges expired sessions,
+    saves the file and returns (file_key, path of the saved CSV).
+    """
+    purge_expired()
+    file_key = uuid.uuid4().hex
+    csv_path = os.path.join(_upload_dir(), f"{file_key}.csv")
+    uploaded.save(csv_path)
+    return file_key, csv_path
+
+
+def _encode(value):
+    # the only non-JSON types in parsed records; tagged so they come back as such
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f"Cannot stage a {type(value).__name__}")
+
+
+def _decode(obj):
+    if obj.keys() == {'__decimal__'}:
+        return Decimal(obj['__decimal__'])
+    if obj.keys() == {'__date__'}:
+        return date.fromisoformat(obj['__date__'])
+    return obj
+
+
+def _loads(line):
+    return json.loads(line, object_hook=_decode)
+
+
+def stage(file_key, kind, records, meta=None):
+    """
+    Store the parsed and resolved `records` of a session so the confirm step
+    writes them without parsing the upload again, then drop the uploaded
+    CSV. The file is JSON lines: a header ({kind, meta}) followed by one
+    record per line, Decimals and dates tagged with their ISO/string form.
+    Records may only hold JSON types, Decimals and dates.
+    """
+    path = _staged_path(file_key)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'kind': kind, 'meta': meta or {}}, default=_encode) + '\n')
+        for record in records:
+            f.write(json.dumps(record, default=_encode) + '\n')
+    os.replace(tmp_path, path)
+
+    csv_path = os.path.join(_upload_dir(), f"{file_key}.csv")
+    if os.path.exists(csv_path):
+        os.remove(csv_path)
+
+
+def _records(f):
+    with f:
+        for line in f:
+            yield _loads(line)
+
+
+def load_stage(file_key, kind):
+    """
+    (meta, records) of a staged `kind` session, records being read lazily
+    line by line. None if the session is unknown, of another kind, not a
+    readable staged file or older than IMPORT_SESSION_TTL.
+    """
+    path = _staged_path(file_key)
+    if path is None or not os.path.exists(path):
+        return None
+    if os.path.getmtime(path) < time.time() - _ttl():
+        os.remove(path)
+        return None
+    f = open(path, encoding='utf-8')
+    try:
+        header = _loads(f.readline())
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('kind') != kind:
+        f.close()
+        return None
+    return header['meta'], _records(f)
+
+
+def discard(file_key):
+    """Remove a session's staged file once it has been imported."""
+    path = _staged_path(file_key)
+    if path and os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,90 @@
+from sqlalchemy import literal, select, union_all
+
+from ..models import Account, Customer, ExpenseInvoice, ExpenseItem, Order, OrderItem, Provider
+from .cad_amounts import sql_cad_amount
+
+
+def ledger_query(start=None, end=None, account_ids=None, account_types=None, detail=False, days=None):
+    """
+    One uniform stream of every posting: order items and expense items
+    combined with UNION ALL. Each row carries
+      - source        ('order' or 'expense')
+      - line_id       (OrderItem.id / ExpenseItem.id)
+      - document_id   (Order.id / ExpenseInvoice.id)
+      - account_id, account_name, account_type
+      - date          (order_date / invoice_date)
+      - currency_code, amount, amount_cad
+    and with `detail=True` also reference (order / invoice number), party
+    (customer / provider name) and description.
+    Date filters (a start/end range or an explicit list of `days`) and account
+    filters are applied inside each branch so they run against the base tables.
+    Returns a subquery to select from.
+    """
+    order_cols = [
+        literal('order').label('source'),
+        OrderItem.id.label('line_id'),
+        Order.id.label('document_id'),
+        Account.id.label('account_id'),
+        Account.name.label('account_name'),
+        Account.type.label('account_type'),
+        Order.order_date.label('date'),
+        OrderItem.currency_code.label('currency_code'),
+        OrderItem.subtotal.label('amount'),
+        sql_cad_amount(OrderItem.subtotal, OrderItem.currency_code,
+                       Order.order_date, OrderItem.amount_cad).label('amount_cad'),
+    ]
+    expense_cols = [
+        literal('expense').label('source'),
+        ExpenseItem.id.label('line_id'),
+        ExpenseInvoice.id.label('document_id'),
+        Account.id.label('account_id'),
+        Account.name.label('account_name'),
+        Account.type.label('account_type'),
+        ExpenseInvoice.invoice_date.label('date'),
+        ExpenseItem.currency_code.label('currency_code'),
+        ExpenseItem.amount.label('amount'),
+        sql_cad_amount(ExpenseItem.amount, ExpenseItem.currency_code,
+                       ExpenseInvoice.invoice_date, ExpenseItem.amount_cad).label('amount_cad'),
+    ]
+    if detail:
+        order_cols += [
+            Order.order_number.label('reference'),
+            Customer.name.label('party'),
+            OrderItem.product_sku.label('description'),
+        ]
+        expense_cols += [
+            ExpenseInvoice.invoice_number.label('reference'),
+            Provider.name.label('party'),
+            ExpenseItem.description.label('description'),
+        ]
+
+    orders = (
+        select(*order_cols)
+        .select_from(OrderItem)
+        .join(Order, OrderItem.order_id == Order.id)
+        .join(Account, OrderItem.account_id == Account.id)
+    )
+    expenses = (
+        select(*expense_cols)
+        .select_from(ExpenseItem)
+        .join(ExpenseInvoice, ExpenseItem.expense_invoice_id == ExpenseInvoice.id)
+        .join(Account, ExpenseItem.account_id == Account.id)
+    )
+    if detail:
+        orders = orders.join(Customer, Order.customer_id == Customer.id)
+        expenses = expenses.join(Provider, ExpenseInvoice.provider_id == Provider.id)
+
+    if start and end:
+        orders = orders.where(Order.order_date.between(start, end))
+        expenses = expenses.where(ExpenseInvoice.invoice_date.between(start, end))
+    if days is not None:
+        orders = orders.where(Order.order_date.in_(days))
+        expenses = expenses.where(ExpenseInvoice.invoice_date.in_(days))
+    if account_ids is not None:
+        orders = orders.where(Account.id.in_(account_ids))
+        expenses = expenses.where(Account.id.in_(account_ids))
+    if account_types is not None:
+        orders = orders.where(Account.type.in_(account_types))
+        expenses = expenses.where(Account.type.in_(account_types))
+
+    return union_all(orders, expenses).subquery('ledger')
@@ -0,0 +1,114 @@
+import calendar
+from datetime import date, datetime
+
+from sqlalchemy import delete, insert, select, union_all
+
+from ..models import db, ClosedPeriod, DailyAccountTotal, FrozenAccountTotal
+from .data_version import bump_data_version
+
+TOTAL_COLUMNS = ['account_id', 'day', 'currency_code', 'amount', 'amount_cad', 'count']
+
+
+class PeriodClosedError(ValueError):
+    """A write was dated inside a closed month."""
+
+
+def month_start(day) -> date:
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.replace(day=1)
+
+
+def month_end(day: date) -> date:
+    """Last day of the month `day` falls in."""
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def closed_months() -> set:
+    """First days of every closed month."""
+    return {row.period_start for row in db.session.query(ClosedPeriod.period_start)}
+
+
+def is_closed(day, closed=None) -> bool:
+    closed = closed_months() if closed is None else closed
+    return day is not None and month_start(day) in closed
+
+
+def ensure_open(days):
+    """
+    Raise PeriodClosedError naming the closed months if any of `days` falls
+    inside one. Called by the import and create paths before they write.
+    """
+    closed = closed_months()
+    if not closed:
+        return
+    hit = sorted({month_start(day) for day in days if day is not None} & closed)
+    if hit:
+        months = ', '.join(month.strftime('%Y-%m') for month in hit)
+        raise PeriodClosedError(f"Period {months} is closed. Reopen it before changing its transactions.")
+
+
+def totals_source():
+    """
+    The daily totals of every period as one selectable: live rows from
+    daily_account_totals for open months and the frozen rows of closed ones.
+    Columns: account_id, day, currency_code, amount, amount_cad, count.
+    """
+    def columns(model):
+        return select(*(getattr(model, name) for name in TOTAL_COLUMNS))
+
+    return union_all(columns(DailyAccountTotal), columns(FrozenAccountTotal)).subquery('account_totals')
+
+
+def close_period(period_start: date) -> int:
+    """
+    Close the month starting on `period_start`: its daily totals move into
+    frozen_account_totals and later writes dated inside it are refused.
+    Only months that have fully ended can be closed. Commits.
+    Returns the number of frozen rows.
+    """
+    period_start = month_start(period_start)
+    period_end = month_end(period_start)
+    if period_end >= date.today():
+        raise ValueError(f"{period_start:%Y-%m} has not ended yet.")
+    if is_closed(period_start):
+        raise ValueError(f"{period_start:%Y-%m} is already closed.")
+
+    in_month = DailyAccountTotal.day.between(period_start, period_end)
+    frozen = db.session.execute(
+        insert(FrozenAccountTotal).from_select(
+            ['period_start', *TOTAL_COLUMNS],
+            select(db.literal(period_start), *(getattr(DailyAccountTotal, name) for name in TOTAL_COLUMNS))
+            .where(in_month)
+        )
+    ).rowcount
+    db.session.execute(delete(DailyAccountTotal).where(in_month))
+    db.session.add(ClosedPeriod(period_start=period_start))
+    bump_data_version()
+    db.session.commit()
+    return frozen
+
+
+def reopen_period(period_start: date) -> int:
+    """
+    Reopen a closed month: its frozen totals move back into
+    daily_account_totals and writes are accepted again. Commits.
+    Returns the number of rows moved back.
+    """
+    period_start = month_start(period_start)
+    closed = ClosedPeriod.query.filter_by(period_start=period_start).first()
+    if closed is None:
+        raise ValueError(f"{period_start:%Y-%m} is not closed.")
+
+    in_month = FrozenAccountTotal.period_start == period_start
+    restored = db.session.execute(
+        insert(DailyAccountTotal).from_select(
+            TOTAL_COLUMNS,
+            select(*(getattr(FrozenAccountTotal, name) for name in TOTAL_COLUMNS)).where(in_month)
+        )
+    ).rowcount
+    db.session.execute(delete(FrozenAccountTotal).where(in_month))
+    db.session.delete(closed)
+    bump_data_version()
+    db.session.commit()
+    return restored
@@ -0,0 +1,142 @@
+import os
+import pickle
+import sqlite3
+import threading
+
+from flask import current_app
+
+from .data_version import current_data_version
+from .lru import LRUCache
+
+
+class MemoryBackend:
+    """In-process LRU store; each worker keeps its own copy."""
+
+    name = 'memory'
+
+    def __init__(self, maxsize: int = 256):
+        self._cache = LRUCache(maxsize)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def put(self, key, version, value):
+        self._cache.put(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+    def size(self) -> int:
+        return len(self._cache)
+
+
+class SQLiteBackend:
+    """
+    Store shared by every worker on the host, kept in a small SQLite file.
+    Values are pickled; entries of older data versions are dropped on write.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_cache ("
+                " key TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM report_cache WHERE key = ?", (repr(key),)
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, key, version, value):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM report_cache WHERE version < ?", (version,))
+            conn.execute(
+                "INSERT OR REPLACE INTO report_cache (key, version, value) VALUES (?, ?, ?)",
+                (repr(key), version, pickle.dumps(value))
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM report_cache")
+
+    def size(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM report_cache").fetchone()[0]
+
+
+class ReportCache:
+    """
+    Cache of computed report results. Keys are extended with the current
+    data version, so any write that bumps it makes older entries unreachable.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: tuple, compute):
+        """Return the cached value for `key` at the current data version, computing it on a miss."""
+        version = current_data_version()
+        versioned_key = (*key, version)
+        value = self.backend.get(versioned_key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            value = compute()
+            self.backend.put(versioned_key, version, value)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend.name,
+                'size': self.backend.size(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def init_report_cache(app):
+    """
+    Create the app's report cache from its config:
+    - REPORT_CACHE_BACKEND: 'memory' (default) or 'sqlite'
+    - REPORT_CACHE_SIZE: entries kept by the memory backend
+    - REPORT_CACHE_PATH: file used by the sqlite backend
+    """
+    backend_name = app.config.get('REPORT_CACHE_BACKEND', 'memory')
+    if backend_name == 'sqlite':
+        backend = SQLiteBackend(app.config['REPORT_CACHE_PATH'])
+    elif backend_name == 'memory':
+        backend = MemoryBackend(app.config.get('REPORT_CACHE_SIZE', 256))
+    else:
+        raise ValueError(f"Unknown REPORT_CACHE_BACKEND '{backend_name}'")
+    app.extensions['report_cache'] = ReportCache(backend)
+
+
+def report_cache() -> ReportCache:
+    return current_app.extensions['report_cache']
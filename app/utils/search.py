@@ -0,0 +1,180 @@
+import re
+
+from sqlalchemy import func, text
+
+from ..models import db, Customer, ExpenseInvoice, ExpenseItem, Order, OrderItem, Product, Provider
+
+BATCH_SIZE = 500
+RESULT_LIMIT = 50
+
+# search_index rows are addressed by rowid = ref_id * 4 + kind code, so an
+# entity's document can be replaced without scanning the index
+KINDS = {'order': 1, 'customer': 2, 'expense': 3}
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    " kind UNINDEXED, ref_id UNINDEXED, title UNINDEXED, detail UNINDEXED, body,"
+    " tokenize = 'unicode61', prefix = '2 3')",
+]
+POSTGRESQL_DDL = [
+    "CREATE TABLE IF NOT EXISTS search_index ("
+    " rowid BIGINT PRIMARY KEY, kind VARCHAR(16) NOT NULL, ref_id INTEGER NOT NULL,"
+    " title TEXT, detail TEXT, body TEXT,"
+    " tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(body, ''))) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_search_index_tsv ON search_index USING gin (tsv)",
+]
+
+
+def _is_postgresql() -> bool:
+    return db.engine.dialect.name == 'postgresql'
+
+
+def create_search_index():
+    """
+    Create the search_index table: an FTS5 virtual table on SQLite, a table
+    with a GIN-indexed tsvector column on PostgreSQL. Used by `create-db`;
+    deployments going through migrations get it from there.
+    """
+    for statement in POSTGRESQL_DDL if _is_postgresql() else SQLITE_DDL:
+        db.session.execute(text(statement))
+
+
+def _doc(kind, ref_id, title, detail, words):
+    return {
+        'rowid': ref_id * 4 + KINDS[kind],
+        'kind': kind,
+        'ref_id': ref_id,
+        'title': title,
+        'detail': detail,
+        'body': ' '.join(str(word) for word in words if word),
+    }
+
+
+def _order_docs(order_ids) -> list[dict]:
+    """
+    Order number, customer name and email, and the SKUs, variants and
+    products of its lines. An order whose customer row is missing is still
+    indexed, by its number and lines.
+    """
+    lines = {}
+    for order_id, sku, variant, product in (
+        db.session.query(OrderItem.order_id, OrderItem.product_sku, OrderItem.variant, Product.name)
+        .outerjoin(Product, OrderItem.product_id == Product.id)
+        .filter(OrderItem.order_id.in_(order_ids), OrderItem.product_sku.notin_(['SHIPPING', 'DISCOUNT']))
+    ):
+        lines.setdefault(order_id, []).extend([sku, variant, product])
+    return [
+        _doc('order', order_id, f"Order #{number}", f"{order_date} · {name}" if name else f"{order_date}",
+             [number, name, email, *lines.get(order_id, [])])
+        for order_id, number, order_date, name, email in (
+            db.session.query(Order.id, Order.order_number, Order.order_date,
+                             func.coalesce(Customer.name, ''), func.coalesce(Customer.email, ''))
+            .outerjoin(Customer, Order.customer_id == Customer.id)
+            .filter(Order.id.in_(order_ids))
+        )
+    ]
+
+
+def _customer_docs(customer_ids) -> list[dict]:
+    return [
+        _doc('customer', customer_id, name, email or '', [name, email])
+        for customer_id, name, email in (
+            db.session.query(Customer.id, Customer.name, Customer.email)
+            .filter(Customer.id.in_(customer_ids))
+        )
+    ]
+
+
+def _expense_docs(invoice_ids) -> list[dict]:
+    """Supplier and invoice numbers, the provider and the descriptions of the lines."""
+    descriptions = {}
+    for invoice_id, description in (
+        db.session.query(ExpenseItem.expense_invoice_id, ExpenseItem.description)
+        .filter(ExpenseItem.expense_invoice_id.in_(invoice_ids))
+    ):
+        descriptions.setdefault(invoice_id, []).append(description)
+    return [
+        _doc('expense', invoice_id, f"{provider} {supplier_invoice or invoice_number or ''}".strip(),
+             f"{invoice_date}",
+             [supplier_invoice, invoice_number, provider, *descriptions.get(invoice_id, [])])
+        for invoice_id, invoice_number, supplier_invoice, invoice_date, provider in (
+            db.session.query(ExpenseInvoice.id, ExpenseInvoice.invoice_number, ExpenseInvoice.supplier_invoice,
+                             ExpenseInvoice.invoice_date, Provider.name)
+            .join(Provider, ExpenseInvoice.provider_id == Provider.id)
+            .filter(ExpenseInvoice.id.in_(invoice_ids))
+        )
+    ]
+
+
+def _reindex(kind, ids, build) -> int:
+    ids = sorted({ref_id for ref_id in ids if ref_id is not None})
+    written = 0
+    for idx in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[idx:idx + BATCH_SIZE]
+        db.session.execute(
+            text("DELETE FROM search_index WHERE rowid IN ({})".format(
+                ', '.join(str(ref_id * 4 + KINDS[kind]) for ref_id in chunk)
+            ))
+        )
+        docs = build(chunk)
+        if docs:
+            db.session.execute(
+                text("INSERT INTO search_index (rowid, kind, ref_id, title, detail, body)"
+                     " VALUES (:rowid, :kind, :ref_id, :title, :detail, :body)"),
+                docs
+            )
+        written += len(docs)
+    return written
+
+
+def index_orders(order_ids) -> int:
+    """(Re)index the given orders. Does not commit."""
+    return _reindex('order', order_ids, _order_docs)
+
+
+def index_customers(customer_ids) -> int:
+    """(Re)index the given customers. Does not commit."""
+    return _reindex('customer', customer_ids, _customer_docs)
+
+
+def index_expense_invoices(invoice_ids) -> int:
+    """(Re)index the given expense invoices with their items. Does not commit."""
+    return _reindex('expense', invoice_ids, _expense_docs)
+
+
+def rebuild_search_index() -> int:
+    """Index every order, customer and expense invoice from scratch. Commits; returns the document count."""
+    db.session.execute(text("DELETE FROM search_index"))
+    count = 0
+    for model, reindex in ((Order, index_orders), (Customer, index_customers),
+                           (ExpenseInvoice, index_expense_invoices)):
+        ids = [row.id for row in db.session.query(model.id).order_by(model.id)]
+        count += reindex(ids)
+    db.session.commit()
+    return count
+
+
+def search(query: str, limit: int = RESULT_LIMIT) -> list[dict]:
+    """
+    Documents matching every word of `query` (each as a prefix), newest
+    entities first. Ordering by rowid lets both backends stop after `limit`
+    hits instead of scoring every match, which keeps broad prefixes fast.
+    Each result has kind, ref_id, title and detail.
+    """
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return []
+    if _is_postgresql():
+        sql = text(
+            "SELECT kind, ref_id, title, detail FROM search_index"
+            " WHERE tsv @@ to_tsquery('simple', :match)"
+            " ORDER BY rowid DESC LIMIT :limit"
+        )
+        match = ' & '.join(f"{word}:*" for word in words)
+    else:
+        sql = text(
+            "SELECT kind, ref_id, title, detail FROM search_index"
+            " WHERE search_index MATCH :match ORDER BY rowid DESC LIMIT :limit"
+        )
+        match = ' '.join(f'"{word}"*' for word in words)
+    return [dict(row._mapping) for row in db.session.execute(sql, {'match': match, 'limit': limit})]
@@ -2,17 +2,48 @@ from datetime import datetime
 from decimal import Decimal
 
 from flask import Blueprint, render_template, url_for, redirect, flash, request
-from ..models import Account, db, ExpenseItem, ExpenseInvoice, Provider
-from ..utils.currency import usd_to_cad
+from sqlalchemy.orm import joinedload
+
+from ..models import Account, db
+from ..utils.currency import usd_to_cad, prefetch_rates
+from ..utils.account_tree import set_parent, subtree_ids
+from ..utils.daily_totals import account_totals
+from ..utils.data_version import bump_data_version
 from ..utils.date_filters import get_date_range
+from ..utils.ledger import ledger_query
 
 bp = Blueprint('accounts', __name__, template_folder='templates/accounts')
 
+ACCOUNT_TYPES = ['Income', 'COGS', 'Expense', 'Fees', 'Service', 'Other']
+
 @bp.route('/')
 def list_accounts():
     """Show all accounts."""
-    accounts = Account.query.order_by(Account.id).all()
-    return render_template('accounts/list.html', accounts=accounts)
+    accounts = Account.query.options(joinedload(Account.parent)).order_by(Account.id).all()
+    start_date, end_date = get_date_range('year_to_date')
+    ytd = {account_id: cad for account_id, (_, cad) in account_totals(start_date, end_date).items()}
+    return render_template('accounts/list.html', accounts=accounts, ytd=ytd)
+
+def _form_context(account=None, form_data=None):
+    """Build common context for both create & edit."""
+    # an account cannot be placed under itself or its own sub-accounts
+    excluded = subtree_ids(account.id) if account else []
+    parents = Account.query.filter(Account.id.notin_(excluded)).order_by(Account.name).all()
+    base = {
+        'name': account.name if account else '',
+        'type': account.type if account else None,
+        'parent_id': account.parent_id if account else None,
+        'description': account.description if account else '',
+    }
+    if form_data:
+        base.update({k: form_data.get(k) for k in base.keys()})
+        base['parent_id'] = form_data.get('parent_id', type=int)
+    return {
+        'account': account,
+        'parents': parents,
+        'types': ACCOUNT_TYPES,
+        'form': base
+    }
 
 @bp.route('/new', methods=['GET', 'POST'])
 def create_account():
@@ -28,14 +59,54 @@ def create_account():
             flash(f"Account '{name}' already exists.", 'warning')
             return redirect(url_for('accounts.list_accounts'))
 
-        acct = Account(name=name, type=type_)
+        # the closure rows are written by the account_tree insert listener
+        acct = Account(
+            name=name,
+            type=type_,
+            parent_id=request.form.get('parent_id', type=int),
+            description=request.form.get('description', '').strip() or None
+        )
         db.session.add(acct)
         db.session.commit()
         flash(f"Account '{name}' created.", 'success')
         return redirect(url_for('accounts.list_accounts'))
 
     # GET: render the new account form
-    return render_template('accounts/new.html')
+    return render_template('accounts/form.html', **_form_context())
+
+@bp.route('/<int:account_id>', methods=['GET', 'POST'])
+def edit_account(account_id):
+    """Rename an account or move it (with its sub-accounts) under another parent."""
+    account = Account.query.get_or_404(account_id)
+
+    if request.method == 'POST':
+        form = request.form
+        name = form.get('name', '').strip()
+        if not name or not form.get('type'):
+            flash('Name and Type are required.', 'warning')
+            return render_template('accounts/form.html', **_form_context(account, form))
+
+        exists = Account.query.filter(Account.name == name, Account.id != account_id).first()
+        if exists:
+            flash(f"Account '{name}' already exists.", 'warning')
+            return render_template('accounts/form.html', **_form_context(account, form))
+
+        try:
+            set_parent(account, form.get('parent_id', type=int))
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return render_template('accounts/form.html', **_form_context(account, form))
+
+        account.name = name
+        account.type = form.get('type')
+        account.description = form.get('description', '').strip() or None
+        bump_data_version()
+        db.session.commit()
+
+        flash(f"Account '{name}' updated.", 'success')
+        return redirect(url_for('accounts.list_accounts'))
+
+    return render_template('accounts/form.html', **_form_context(account))
 
 @bp.route('/account/<int:account_id>/transactions')
 def account_transactions(account_id):
@@ -48,49 +119,50 @@ def account_transactions(account_id):
     end   = datetime.fromisoformat(end_str).date()   if end_str   else None
     start_date, end_date = get_date_range(range_key, start, end)
 
-    # 2) load the account
+    # 2) load the account, and with ?subtree=1 all of its sub-accounts
     account = Account.query.get_or_404(account_id)
+    subtree = request.args.get('subtree') == '1'
+    account_ids = subtree_ids(account_id) if subtree else [account_id]
 
-    # 3) fetch all ExpenseItems for this account in date range
-    q = (
-        db.session.query(
-            ExpenseItem,
-            ExpenseInvoice.invoice_date.label('date'),
-            ExpenseInvoice.invoice_number.label('inv_num'),
-            Provider.name.label('provider_name')
-        )
-        .join(ExpenseInvoice, ExpenseItem.expense_invoice_id==ExpenseInvoice.id)
-        .join(Provider, ExpenseInvoice.provider_id==Provider.id)
-        .filter(ExpenseItem.account_id == account_id)
+    # 3) fetch every ledger line (order and expense items) for these accounts in date range
+    ledger = ledger_query(start_date, end_date, account_ids=account_ids, detail=True)
+    rows = (
+        db.session.query(ledger)
+        .order_by(ledger.c.date.desc(), ledger.c.line_id.desc())
+        .all()
     )
-    if start_date and end_date:
-        q = q.filter(ExpenseInvoice.invoice_date.between(start_date, end_date))
-
-    rows = q.order_by(ExpenseInvoice.invoice_date.desc()).all()
+    prefetch_rates(row.date for row in rows
+                   if row.currency_code != 'CAD' and row.amount_cad is None)
 
-    # 4) compute totals
-    total_orig = Decimal('0')
-    total_cad  = Decimal('0')
+    # 4) build entries; totals come from the daily account totals
+    totals = account_totals(start_date, end_date, account_ids).values()
+    total_orig = sum((amount for amount, _ in totals), Decimal('0'))
+    total_cad = sum((cad for _, cad in totals), Decimal('0'))
     entries = []
-    for item, date, inv_num, prov in rows:
-        amt = item.amount or Decimal('0')
-        total_orig += amt
-        cad = (usd_to_cad(amt, date) if item.currency_code!='CAD' else amt)
-        total_cad += cad
+    for row in rows:
+        amt = row.amount or Decimal('0')
+        if row.amount_cad is not None:
+            cad = row.amount_cad
+        else:
+            cad = (usd_to_cad(amt, row.date) if row.currency_code!='CAD' else amt)
         entries.append({
-            'date': date,
-            'invoice_number': inv_num,
-            'provider': prov,
-            'description': item.description,
+            'source': row.source,
+            'date': row.date,
+            'account': row.account_name,
+            'invoice_number': row.reference,
+            'provider': row.party,
+            'description': row.description,
             'amount': amt,
-            'currency': item.currency_code,
+            'currency': row.currency_code,
             'amount_cad': cad,
-            'invoice_id': item.expense_invoice_id
+            'invoice_id': row.document_id
         })
 
     return render_template(
         'accounts/transactions.html',
         account=account,
+        subtree=subtree,
+        has_children=bool(account.children),
         entries=entries,
         total_orig=total_orig,
         total_cad=total_cad,
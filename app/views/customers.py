@@ -1,18 +1,21 @@
+from decimal import Decimal
+
 from flask import Blueprint, render_template, url_for, redirect, flash
 from sqlalchemy import func
-from ..models import db, Customer, Order
+from ..models import db, Customer, CustomerStats
+from ..utils.customer_stats import cohort_rows
 
 bp = Blueprint('customers', __name__, template_folder='templates/customers')
 
 @bp.route('/')
 def list_customers():
-    # Aggregate order stats per customer
+    # Order stats per customer, kept up to date in customer_stats by the order import
     stats = db.session.query(
         Customer,
-        func.count(Order.id).label('order_count'),
-        func.max(Order.order_date).label('last_order_date'),
-        func.coalesce(func.sum(Order.total_amount), 0).label('amount_spent')
-    ).outerjoin(Order).group_by(Customer.id).all()
+        func.coalesce(CustomerStats.order_count, 0).label('order_count'),
+        CustomerStats.last_order_date.label('last_order_date'),
+        func.coalesce(CustomerStats.amount_spent, 0).label('amount_spent')
+    ).outerjoin(CustomerStats, CustomerStats.customer_id == Customer.id).all()
 
     total_customers = len(stats)
     total_spent = sum(stat.amount_spent for stat in stats)
@@ -24,6 +27,37 @@ def list_customers():
         total_spent=total_spent
     )
 
+@bp.route('/cohorts')
+def cohorts():
+    """First-order month cohorts with repeat rate and lifetime value (CAD)."""
+    cohorts = []
+    running = Decimal('0')
+    for row in cohort_rows():
+        revenue = Decimal(row.revenue_cad or 0)
+        running += revenue
+        cohorts.append({
+            'cohort': row.cohort,
+            'customers': row.customers,
+            'repeat_customers': row.repeat_customers,
+            'repeat_rate': (Decimal(row.repeat_customers) / row.customers * 100).quantize(Decimal('0.1')),
+            'orders': row.orders,
+            'revenue_cad': revenue,
+            'ltv_cad': (revenue / row.customers).quantize(Decimal('0.01')),
+            'running_revenue_cad': running,
+        })
+
+    customers = sum(c['customers'] for c in cohorts)
+    repeat_customers = sum(c['repeat_customers'] for c in cohorts)
+    totals = {
+        'customers': customers,
+        'repeat_customers': repeat_customers,
+        'repeat_rate': (Decimal(repeat_customers) / customers * 100).quantize(Decimal('0.1')) if customers else None,
+        'orders': sum(c['orders'] for c in cohorts),
+        'revenue_cad': running,
+        'ltv_cad': (running / customers).quantize(Decimal('0.01')) if customers else None,
+    }
+    return render_template('customers/cohorts.html', cohorts=cohorts, totals=totals)
+
 @bp.route('/new')
 def create_customer():
     # Placeholder for customer creation form
@@ -34,4 +68,4 @@ def create_customer():
 def import_customers():
     # Placeholder for customer import
     flash('Customer import not implemented yet', 'info')
-    return redirect(url_for('customers.list_customers'))
\ No newline at end of file
+    return redirect(url_for('customers.list_customers'))
@@ -12,7 +12,13 @@ from flask import (
 from werkzeug.utils import secure_filename
 
 from ..models import db, ExpenseInvoice, ExpenseInvoiceFile, Provider, ExpenseItem, Account, Order, ExpenseTemplate, ExpenseTemplateItem
-from ..utils.currency import usd_to_cad
+from ..utils.cad_amounts import cad_fields, apply_cad
+from ..utils.currency import usd_to_cad, prefetch_rates
+from ..utils.daily_totals import refresh_daily_totals
+from ..utils.data_version import bump_data_version
+from ..utils.import_sessions import discard, load_stage, save_upload, stage
+from ..utils.periods import PeriodClosedError, ensure_open
+from ..utils.search import index_expense_invoices
 from ..utils.date_filters import get_date_range
 
 bp = Blueprint('expenses', __name__, template_folder='templates/expenses')
@@ -61,6 +67,29 @@ def _save_invoice_files(invoice_id, files):
     return saved, rejected
 
 
+def _order_ids(order_numbers):
+    """{order_number: orders.id} for the given numbers that match an order."""
+    numbers = {number for number in order_numbers if number}
+    if not numbers:
+        return {}
+    return dict(
+        db.session.query(Order.order_number, Order.id)
+        .filter(Order.order_number.in_(numbers))
+        .all()
+    )
+
+
+def _current_invoices(invoices):
+    """{(provider_id, invoice_number): ExpenseInvoice} for the staged invoices already in the database."""
+    numbers = {inv['invoice_number'] for inv in invoices if inv['invoice_number']}
+    if not numbers:
+        return {}
+    return {
+        (ei.provider_id, ei.invoice_number): ei
+        for ei in ExpenseInvoice.query.filter(ExpenseInvoice.invoice_number.in_(numbers))
+    }
+
+
 @bp.route('/new', methods=['GET', 'POST'])
 def create_expense():
     providers = Provider.query.order_by(Provider.name).all()
@@ -83,6 +112,10 @@ def create_expense():
         except:
             invoice_date = None
             errors.append("Invalid date")
+        try:
+            ensure_open([invoice_date])
+        except PeriodClosedError as e:
+            errors.append(str(e))
 
         # Parse line-items
         line_items = []
@@ -134,6 +167,9 @@ def create_expense():
         db.session.add(ei)
         db.session.flush()
 
+        prov = Provider.query.get(provider_id)
+        order_id = _order_ids([invoice_number]).get(invoice_number)
+
         # Create each ExpenseItem
         for desc, acct_id, amt in line_items:
             db.session.add(ExpenseItem(
@@ -141,13 +177,13 @@ def create_expense():
                 account_id=acct_id,
                 description=desc,
                 amount=amt,
-                currency_code=Provider.query.get(provider_id).currency_code,
-                order_id=invoice_number
+                currency_code=prov.currency_code,
+                order_id=order_id,
+                **cad_fields(amt, prov.currency_code, invoice_date)
             ))
 
         subtotal = sum(amt for _, _, amt in line_items)
         # if CAD, add GST
-        prov = Provider.query.get(provider_id)
         if prov.currency_code == 'CAD':
             gst = (subtotal * Decimal('0.05')).quantize(Decimal('0.01'))
 
@@ -163,14 +199,19 @@ def create_expense():
                 description='GST',
                 amount=gst,
                 currency_code=prov.currency_code,
-                order_id=invoice_number
+                order_id=order_id,
+                **cad_fields(gst, prov.currency_code, invoice_date)
             ))
 
         ei.total_amount = subtotal + gst
+        apply_cad(ei, ei.total_amount, prov.currency_code, invoice_date)
         saved, rejected = _save_invoice_files(
             ei.id,
             request.files.getlist('invoice_pdfs')
         )
+        refresh_daily_totals([invoice_date])
+        index_expense_invoices([ei.id])
+        bump_data_version()
         db.session.commit()
         db.session.flush()
 
@@ -227,11 +268,15 @@ def list_expenses():
     account = Account.query.get(account_id) if account_id else None
 
     # compute grand‐total in CAD
+    prefetch_rates(inv.invoice_date for inv in invoices
+                   if inv.provider.currency_code != 'CAD' and inv.amount_cad is None)
     total_cad = 0
     for inv in invoices:
         amt = inv.total_amount
+        if inv.amount_cad is not None:
+            amt = inv.amount_cad
         # if original was USD, convert
-        if inv.provider.currency_code != 'CAD':
+        elif inv.provider.currency_code != 'CAD':
             amt = usd_to_cad(amt, inv.invoice_date)
         total_cad += amt
 
@@ -259,11 +304,7 @@ def import_expenses():
             return redirect(url_for('expenses.import_expenses'))
 
         # persist upload
-        upload_dir = os.path.join(current_app.root_path, 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        file_key = f"{uuid.uuid4().hex}.csv"
-        file_path = os.path.join(upload_dir, file_key)
-        uploaded.save(file_path)
+        file_key, file_path = save_upload(uploaded)
 
         # pick the importer module dynamically
         provider = Provider.query.get_or_404(provider_id)
@@ -273,10 +314,13 @@ def import_expenses():
         for payee in missing:
             flash(f"No matching provider found for “{payee}”; row skipped.", 'warning')
 
-        # mark which invoices have a matching order_number in our DB
-        existing_orders = {o.order_number for o in Order.query.with_entities(Order.order_number)}
+        # resolve the order each invoice belongs to, then stage the parsed
+        # invoices so confirming writes them without parsing the file again
+        order_ids = _order_ids(inv['invoice_number'] for inv in invoices)
         for inv in invoices:
-            inv['order_exists'] = (inv['invoice_number'] in existing_orders)
+            inv['order_id'] = order_ids.get(inv['invoice_number'])
+            inv['order_exists'] = inv['order_id'] is not None
+        stage(file_key, 'expenses', invoices, meta={'provider_id': provider_id})
 
         # render a verify page listing each invoice + its items
         return render_template(
@@ -298,27 +342,54 @@ def confirm_expenses():
         flash('Import session invalid. Start again.', 'warning')
         return redirect(url_for('expenses.import_expenses'))
 
-    # rebuild filepath
-    upload_dir = os.path.join(current_app.root_path, 'uploads')
-    filepath = os.path.join(upload_dir, file_key)
-    if not os.path.exists(filepath):
+    # the invoices parsed and resolved on upload
+    staged = load_stage(file_key, 'expenses')
+    if staged is None:
         flash('Upload expired. Please re-upload.', 'warning')
         return redirect(url_for('expenses.import_expenses'))
-
-    # find the provider & its chosen importer
+    meta, invoices = staged
+    if meta['provider_id'] != provider_id:
+        flash('Import session invalid. Start again.', 'warning')
+        return redirect(url_for('expenses.import_expenses'))
+    invoices = list(invoices)
     provider = Provider.query.get_or_404(provider_id)
-    importer_name = provider.importer or 'generic'
-    module = importlib.import_module(f'app.importers.{importer_name}')
-    invoices, missing = module.parse(filepath, provider_id)
+
+    # decide create/update/skip again against the invoices as they are now:
+    # one staged for update may have been deleted since the upload, one
+    # staged for creation may have been imported in the meantime
+    current = _current_invoices(invoices)
+    for inv in invoices:
+        existing = current.get((inv['provider_id'], inv['invoice_number']))
+        if existing is None:
+            inv['action'], inv['existing_id'] = 'create', None
+        else:
+            inv['action'] = 'skip' if existing.total_amount == inv['total_amount'] else 'update'
+            inv['existing_id'] = existing.id
+
+    # refuse the whole file if it touches a closed period, including the
+    # dates updated invoices move away from
+    moved_from = [
+        current[(inv['provider_id'], inv['invoice_number'])].invoice_date
+        for inv in invoices if inv['action'] == 'update'
+    ]
+    try:
+        ensure_open([inv['invoice_date'] for inv in invoices if inv['action'] != 'skip'] + moved_from)
+    except PeriodClosedError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('expenses.import_expenses'))
 
     created = 0
+    touched_days = set()
+    touched_invoices = set()
     for inv in invoices:
         if inv['action'] == 'skip':
             continue
         elif inv['action'] == 'update':
             ei = ExpenseInvoice.query.get(inv['existing_id'])
+            touched_days.add(ei.invoice_date)  # the day the invoice moves away from
             ei.invoice_date = inv['invoice_date']
             ei.total_amount = inv['total_amount']
+            apply_cad(ei, ei.total_amount, provider.currency_code, ei.invoice_date)
             db.session.add(ei)
         else:
             # create the invoice header
@@ -327,7 +398,8 @@ def confirm_expenses():
                 invoice_date=inv['invoice_date'],
                 invoice_number=inv['invoice_number'],
                 supplier_invoice=inv['supplier_invoice'],
-                total_amount=inv['total_amount']
+                total_amount=inv['total_amount'],
+                **cad_fields(inv['total_amount'], provider.currency_code, inv['invoice_date'])
             )
             db.session.add(ei)
             db.session.flush()  # get ei.id
@@ -349,6 +421,7 @@ def confirm_expenses():
                     # update the amount (and currency, if you want)
                     existing_invoice.amount = amt
                     existing_invoice.currency_code = provider.currency_code
+                    apply_cad(existing_invoice, amt, provider.currency_code, ei.invoice_date)
                     db.session.add(existing_invoice)
             else:
                 ei_line = ExpenseItem(
@@ -357,14 +430,20 @@ def confirm_expenses():
                     description=item['description'],
                     amount=item['amount'],
                     currency_code=item['currency_code'],
-                    order_id=inv['invoice_number'],
+                    order_id=inv['order_id'],
+                    **cad_fields(item['amount'], item['currency_code'], inv['invoice_date'])
                 )
                 db.session.add(ei_line)
 
         created += 1
+        touched_days.add(inv['invoice_date'])
+        touched_invoices.add(ei.id)
 
+    refresh_daily_totals(touched_days)
+    index_expense_invoices(touched_invoices)
+    bump_data_version()
     db.session.commit()
-    os.remove(filepath)
+    discard(file_key)
 
     flash(f'Successfully imported {created} expense invoices.', 'success')
     return redirect(url_for('expenses.list_expenses'))
@@ -1,10 +1,38 @@
+from decimal import Decimal
+
 from flask import Blueprint, render_template
+from sqlalchemy import func
+
+from ..models import db, Account
+from ..utils.date_filters import get_date_range
+from ..utils.periods import totals_source
 
 bp = Blueprint('main', __name__)
 
 @bp.route('/')
 def dashboard():
-    return render_template('main/top.html')
+    # month-to-date totals per account type, from the daily account totals
+    start_date, end_date = get_date_range('this_month')
+    t = totals_source()
+    totals = dict(
+        db.session.query(Account.type, func.sum(t.c.amount_cad))
+        .select_from(t)
+        .join(Account, t.c.account_id == Account.id)
+        .filter(t.c.day.between(start_date, end_date))
+        .group_by(Account.type)
+        .all()
+    )
+    income = totals.get('Income') or Decimal('0')
+    cogs = totals.get('COGS') or Decimal('0')
+    expenses = (totals.get('Expense') or Decimal('0')) + (totals.get('Fees') or Decimal('0'))
+    summary = {
+        'income': income,
+        'cogs': cogs,
+        'expenses': expenses,
+        'net_profit': income - cogs - expenses,
+    }
+    return render_template('main/top.html', summary=summary,
+                           start_date=start_date, end_date=end_date)
 
 
 @bp.route('/healthz')
@@ -1,29 +1,132 @@
 import csv
-import os
-import uuid
 from datetime import date, datetime
 from decimal import Decimal
+from itertools import islice
 
 from flask import (
     Blueprint, render_template, url_for, redirect,
     flash, request, current_app
 )
-from sqlalchemy import func, cast, String
+from sqlalchemy import func, select, case, insert, or_, and_
 
 from ..models import db, Order, Customer, OrderItem, Product, Account, ExpenseItem, Provider, ExpenseInvoice
-from ..utils.currency import usd_to_cad
+from ..utils.cad_amounts import cad_fields, cad_rate, sql_cad_amount, sql_order_currency
+from ..utils.currency import usd_to_cad, prefetch_rates
+from ..utils.customer_stats import refresh_customer_stats
+from ..utils.daily_totals import refresh_daily_totals
+from ..utils.data_version import bump_data_version
+from ..utils.import_sessions import discard, load_stage, save_upload, stage
+from ..utils.periods import PeriodClosedError, ensure_open
+from ..utils.search import index_customers, index_expense_invoices, index_orders
 from ..utils.date_filters import get_date_range
 
 bp = Blueprint('orders', __name__, template_folder='templates/orders')
 
+FEE_ACCOUNTS = ['Merchant Fees', 'Currency Conversion Fees']
+COGS_ACCOUNTS = ['COGS', 'COGS Shipping', 'COGS Tax']
+MAX_ORDERS_PAGE_SIZE = 500
+# orders parsed and written per step of perform_import, and rows per bulk INSERT
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+
+
+def _payment_method(raw):
+    raw = raw.lower()
+    if 'shopify' in raw:
+        return 'shopify'
+    if 'paypal' in raw:
+        return 'paypal'
+    return None
+
+
+def iter_orders_csv(filepath):
+    """
+    Streams the orders of a Shopify export at filepath, one dict per order
+    (order fields, `customer` and an `items` list), in file order.
+    An order is yielded as soon as the next order's header row (or the end
+    of the file) shows it is complete, so only the current order is held in
+    memory. Existing orders are yielded too; callers decide what to skip.
+    """
+    with open(filepath, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        columns = {name: idx for idx, name in enumerate(next(reader, []))}
+
+        def field(row, name):
+            idx = columns.get(name)
+            return row[idx].strip() if idx is not None and idx < len(row) else ''
+
+        order = None
+        for row in reader:
+            order_key = field(row, 'Name')
+
+            # start of new order: hand out the previous one
+            if order_key and field(row, 'Financial Status'):
+                if order is not None:
+                    yield order
+
+                created_at = field(row, 'Created at')
+                try:
+                    order_date = date.fromisoformat(created_at.split(' ')[0]) if created_at else None
+                except ValueError:
+                    order_date = None
+
+                email = field(row, 'Email')
+                order = {
+                    'order_number': order_key.lstrip('#'),
+                    'customer_email': email,
+                    'order_date': order_date,
+                    'delivery_status': field(row, 'Fulfillment Status') or 'unfulfilled',
+                    'sub_total': Decimal(field(row, 'Subtotal') or 0),
+                    'shipping': Decimal(field(row, 'Shipping') or 0),
+                    'taxes': Decimal(field(row, 'Taxes') or 0),
+                    'order_total': Decimal(field(row, 'Total') or 0),
+                    'discount_amount': Decimal(field(row, 'Discount Amount') or 0),
+                    'items': [],
+                    'order_currency': field(row, 'Currency'),
+                    'payment_method': _payment_method(field(row, 'Payment Method')),
+                    'customer': {
+                        'name': field(row, 'Billing Name'),
+                        'email': email,
+                        'phone': field(row, 'Billing Phone') or field(row, 'Phone'),
+                        'address': ', '.join(
+                            p for p in [
+                                field(row, 'Billing Address1'),
+                                field(row, 'Billing City'),
+                                field(row, 'Billing Province'),
+                                field(row, 'Billing Zip'),
+                                field(row, 'Billing Country')
+                            ] if p
+                        )
+                    }
+                }
+
+            # line items for the current order
+            name = field(row, 'Lineitem name')
+            if name and order is not None:
+                parts = name.rsplit(' - ', 1)
+                order['items'].append({
+                    'name': parts[0],
+                    'variant': parts[1] if len(parts) > 1 else None,
+                    'product_sku': field(row, 'Lineitem sku'),
+                    'quantity': int(field(row, 'Lineitem quantity') or 0),
+                    'currency_code': order['order_currency'],
+                    'unit_price': Decimal(field(row, 'Lineitem price') or 0)
+                })
+
+        if order is not None:
+            yield order
+
 
 def parse_orders_csv(filepath):
     """
-    Parses the CSV at filepath and returns three dicts:
+    Parses the CSV at filepath and returns four dicts:
       - customers_to_create: {email: {name,email,phone,address}}
       - products_to_create:  {product_name: {name,price}}
       - orders_data:         {order_number: {order fields + items list}}
-    Skips any existing orders (by order_number).
+      - updates_data:        {order_number: {order_number,new_status}}
+    Skips any existing orders (by order_number), tracking their status changes.
+    Used by the verify page, which lists everything; the import itself
+    streams the file through iter_orders_csv.
     """
     existing_customers = {c.email for c in Customer.query.with_entities(Customer.email)}
     existing_products = {p.name for p in Product.query.with_entities(Product.name)}
@@ -36,238 +139,201 @@ def parse_orders_csv(filepath):
     products_to_create = {}
     orders_data = {}
     updates_data = {}
-    current_order = None
 
-    with open(filepath, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            order_key = row.get('Name', '').strip()
-            financial_status = row.get('Financial Status', '').strip()
-            order_currency = row.get('Currency', '').strip()
-
-            # start of new order
-            if order_key and financial_status:
-                num = order_key.lstrip('#')
-                raw_pm = row.get('Payment Method', '').lower()
-                if 'shopify' in raw_pm:
-                    pm = 'shopify'
-                elif 'paypal' in raw_pm:
-                    pm = 'paypal'
-                else:
-                    pm = None
-
-                new_status = row.get('Fulfillment Status', '').strip() or 'unfulfilled'
-                # existing order → track status change, then skip
-                if num in existing_orders:
-                    if existing_orders[num] != new_status:
-                        updates_data[num] = {
-                            'order_number': num,
-                            'new_status': new_status
-                        }
-                    current_order = None
-                    continue
-
-                created_at = row.get('Created at', '').strip()
-                if created_at:
-                    date_str = created_at.split(' ')[0]
-                    try:
-                        order_date = date.fromisoformat(date_str)
-                    except ValueError:
-                        order_date = None
-                else:
-                    order_date = None
-
-                # initialize new order
-                orders_data[num] = {
+    for od in iter_orders_csv(filepath):
+        num = od['order_number']
+        # existing order → track status change, then skip
+        if num in existing_orders:
+            if existing_orders[num] != od['delivery_status']:
+                updates_data[num] = {
                     'order_number': num,
-                    'customer_email': row.get('Email', '').strip(),
-                    'order_date': order_date,
-                    'delivery_status': new_status,
-                    'sub_total': Decimal(row.get('Subtotal', '0').strip() or 0),
-                    'shipping': Decimal(row.get('Shipping', '0').strip() or 0),
-                    'taxes': Decimal(row.get('Taxes', '0').strip() or 0),
-                    'order_total': Decimal(row.get('Total', '0').strip() or 0),
-                    'discount_amount': Decimal(row.get('Discount Amount', '0').strip() or 0),
-                    'items': [],
-                    'order_currency': order_currency,
-                    'payment_method': pm
+                    'new_status': od['delivery_status']
                 }
-                current_order = num
+            continue
+        orders_data[num] = od
 
-                # queue new customer
-                email = row.get('Email', '').strip()
-                if email and email not in existing_customers and email not in customers_to_create:
-                    customers_to_create[email] = {
-                        'name': row.get('Billing Name', '').strip(),
-                        'email': email,
-                        'phone': row.get('Billing Phone', '').strip() or row.get('Phone', '').strip(),
-                        'address': ', '.join(
-                            p for p in [
-                                row.get('Billing Address1', '').strip(),
-                                row.get('Billing City', '').strip(),
-                                row.get('Billing Province', '').strip(),
-                                row.get('Billing Zip', '').strip(),
-                                row.get('Billing Country', '').strip()
-                            ] if p
-                        )
-                    }
+        # queue new customer
+        email = od['customer_email']
+        if email and email not in existing_customers and email not in customers_to_create:
+            customers_to_create[email] = od['customer']
 
-            # line items for the current order
-            name = row.get('Lineitem name', '').strip()
-            if name and current_order:
-                parts = name.rsplit(' - ', 1)
-                base = parts[0]
-                var = parts[1] if len(parts) > 1 else None
-                price = Decimal(row.get('Lineitem price', '0').strip() or 0)
-                qty = int(row.get('Lineitem quantity', '0').strip() or 0)
-                sku = row.get('Lineitem sku', '').strip()
-
-                # queue new product
-                if base not in existing_products and base not in products_to_create:
-                    products_to_create[base] = {'name': base, 'price': price}
-
-                orders_data[current_order]['items'].append({
-                    'name': base,
-                    'variant': var,
-                    'product_sku': sku,
-                    'quantity': qty,
-                    'currency_code': orders_data[current_order]['order_currency'],
-                    'unit_price': price
-                })
+        # queue new products
+        for it in od['items']:
+            if it['name'] not in existing_products and it['name'] not in products_to_create:
+                products_to_create[it['name']] = {'name': it['name'], 'price': it['unit_price']}
 
     return customers_to_create, products_to_create, orders_data, updates_data
 
 
-def perform_import(filepath):
+def _insert_returning_ids(model, rows, key) -> dict:
     """
-    Parses and writes to DB: creates customers, products, orders, order items,
-    plus shipping & discount line‐items in dedicated accounts.
-    Returns number of orders created.
+    Bulk insert `rows` in chunks of IMPORT_BATCH_SIZE and return {row[key]: new id}.
+    `key` must be unique among the rows; matching on it lets the ids come
+    back in whatever order the database returns them, which keeps every
+    chunk a single multi-row INSERT ... RETURNING.
     """
-    customers_to_create, products_to_create, orders_data, updates_data = parse_orders_csv(filepath)
-
-    # --- create customers ---
-    email_map = {}
-    for email, data in customers_to_create.items():
-        customer = Customer.query.filter_by(email=email).first()
-        if not customer:
-            customer = Customer(**data)
-            db.session.add(customer)
-        email_map[email] = customer
-    db.session.commit()
+    table = model.__table__
+    ids = {}
+    for idx in range(0, len(rows), IMPORT_BATCH_SIZE):
+        ids.update(
+            (row[1], row[0]) for row in db.session.execute(
+                insert(table).returning(table.c.id, table.c[key]),
+                rows[idx:idx + IMPORT_BATCH_SIZE]
+            )
+        )
+    return ids
 
-    # --- create products ---
-    name_map = {}
-    for name, data in products_to_create.items():
-        product = Product.query.filter_by(name=name).first()
-        if not product:
-            product = Product(name=data['name'], price=data['price'])
-            db.session.add(product)
-        name_map[name] = product
-    db.session.commit()
 
-    # --- look up accounts ---
-    income_acc = Account.query.filter_by(type='Income').first()
-    default_acc_id = income_acc.id if income_acc else None
+def _insert_rows(model, rows):
+    # Core inserts on the table: the ORM bulk path would split a chunk into
+    # one statement per run of rows with the same NULL columns
+    for idx in range(0, len(rows), IMPORT_BATCH_SIZE):
+        db.session.execute(insert(model.__table__), rows[idx:idx + IMPORT_BATCH_SIZE])
 
-    ship_acc = Account.query.filter_by(name='Shipping Charged').first()
-    ship_acc_id = ship_acc.id if ship_acc else default_acc_id
 
-    disc_acc = Account.query.filter_by(name='Discounts Given').first()
-    disc_acc_id = disc_acc.id if disc_acc else default_acc_id
+def _first_currency(od):
+    """Currency code of a parsed order's first line (None without lines)."""
+    return od['items'][0].get('currency_code') if od['items'] else None
 
-    merchant_acc = Account.query.filter_by(name='Merchant Fees').first()
-    merchant_acc_id = merchant_acc.id if merchant_acc else default_acc_id
 
-    conv_acc = Account.query.filter_by(name='Currency Conversion Fees').first()
-    conv_acc_id = conv_acc.id if conv_acc else default_acc_id
+def _import_accounts() -> dict:
+    """Account ids used by the import, keyed by role; missing accounts fall back to the income account."""
+    by_name = {name: acc_id for acc_id, name in db.session.query(Account.id, Account.name)}
+    income_acc = Account.query.filter_by(type='Income').first()
+    default_acc_id = income_acc.id if income_acc else None
+    return {
+        'default': default_acc_id,
+        'shipping': by_name.get('Shipping Charged', default_acc_id),
+        'discount': by_name.get('Discounts Given', default_acc_id),
+        'merchant': by_name.get('Merchant Fees', default_acc_id),
+        'conversion': by_name.get('Currency Conversion Fees', default_acc_id),
+    }
 
-    created_count = 0
 
-    # pick a currency code for fees (we store fees in CAD)
-    fee_currency = 'CAD'
-
-    # --- create orders + items ---
-    for num, od in orders_data.items():
-        # customer lookup
-        cust = Customer.query.filter_by(email=od['customer_email']).first() \
-               or email_map.get(od['customer_email'])
-
-        # create Order header
-        order = Order(
-            order_number=od['order_number'],
-            customer_id=cust.id,
-            order_date=od['order_date'],
-            total_amount=od['order_total'],
-            sub_total=od.get('sub_total'),
-            shipping=od.get('shipping'),
-            taxes=od.get('taxes'),
-            discount_amount=od.get('discount_amount'),
-            delivery_status=od['delivery_status'],
-            payment_method=od['payment_method']
-        )
-        db.session.add(order)
-        db.session.flush()  # so order.id is assigned
+def _import_chunk(chunk, acc, shopify) -> tuple[int, set]:
+    """
+    Writes one chunk of parsed orders: skips the ones already stored,
+    creates the missing customers and products, then the orders, their
+    items and Shopify fee invoices. Returns (orders created, their dates).
+    Raises PeriodClosedError if a new order falls in a closed period.
+    """
+    numbers = [od['order_number'] for od in chunk]
+    existing = {
+        num for num, in db.session.query(Order.order_number).filter(Order.order_number.in_(numbers))
+    }
+    orders_data = {od['order_number']: od for od in chunk if od['order_number'] not in existing}
+    orders = list(orders_data.values())
+    if not orders:
+        return 0, set()
+    ensure_open(od['order_date'] for od in orders)
+
+    # --- create customers, resolve every email to an id ---
+    emails = {od['customer_email'] for od in orders}
+    customer_ids = {}
+    for cust_id, email in (
+        db.session.query(Customer.id, Customer.email)
+        .filter(Customer.email.in_(emails))
+        .order_by(Customer.id)
+    ):
+        customer_ids.setdefault(email, cust_id)
+    new_customers = {}
+    for od in orders:
+        email = od['customer_email']
+        if email and email not in customer_ids:
+            new_customers.setdefault(email, od['customer'])
+    customer_ids.update(_insert_returning_ids(Customer, list(new_customers.values()), 'email'))
+
+    # --- create products, resolve every name to an id ---
+    names = {it['name'] for od in orders for it in od['items']}
+    product_ids = {}
+    for prod_id, name in (
+        db.session.query(Product.id, Product.name)
+        .filter(Product.name.in_(names))
+        .order_by(Product.id)
+    ):
+        product_ids.setdefault(name, prod_id)
+    new_products = {}
+    for od in orders:
+        for it in od['items']:
+            if it['name'] not in product_ids:
+                new_products.setdefault(it['name'], {'name': it['name'], 'price': it['unit_price']})
+    product_ids.update(_insert_returning_ids(Product, list(new_products.values()), 'name'))
+
+    # --- resolve the chunk's exchange rates once ---
+    dates_by_currency = {}
+    for od in orders:
+        currencies = {it.get('currency_code') for it in od['items']} | {od['order_currency'], 'USD'}
+        if od['payment_method'] == 'shopify' and shopify:
+            currencies.add(shopify.currency_code)
+        for currency_code in currencies - {'CAD'}:
+            dates_by_currency.setdefault(currency_code or 'USD', set()).add(od['order_date'])
+    for currency_code, dates in dates_by_currency.items():
+        prefetch_rates(dates, currency_code)
+
+    # --- create order headers ---
+    order_rows = []
+    for od in orders:
+        order_rows.append({
+            'order_number': od['order_number'],
+            'customer_id': customer_ids.get(od['customer_email']),
+            'order_date': od['order_date'],
+            'total_amount': od['order_total'],
+            'sub_total': od.get('sub_total'),
+            'shipping': od.get('shipping'),
+            'taxes': od.get('taxes'),
+            'discount_amount': od.get('discount_amount'),
+            'delivery_status': od['delivery_status'],
+            'payment_method': od['payment_method'],
+            **cad_fields(od['order_total'], _first_currency(od) or od['order_currency'], od['order_date'])
+        })
+    order_ids = _insert_returning_ids(Order, order_rows, 'order_number')
+
+    # --- order items and Shopify fee invoices ---
+    item_rows = []
+    fee_rows = []
+    fee_items = []
+
+    def line(order_id, product_id, sku, variant, quantity, unit_price, subtotal, currency_code, account_id, on_date):
+        item_rows.append({
+            'order_id': order_id,
+            'product_id': product_id,
+            'product_sku': sku,
+            'variant': variant,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'subtotal': subtotal,
+            'currency_code': currency_code,
+            'account_id': account_id,
+            **cad_fields(subtotal, currency_code, on_date)
+        })
 
-        # grab a currency_code from the first line (fallback to None)
-        first_currency = None
-        if od['items']:
-            first_currency = od['items'][0].get('currency_code')
+    for od in orders:
+        order_id = order_ids[od['order_number']]
+        order_date = od['order_date']
+        first_currency = _first_currency(od)
 
         # 1) product line items
         for it in od['items']:
-            prod = Product.query.filter_by(name=it['name']).first() \
-                   or name_map.get(it['name'])
-            subtotal = it['unit_price'] * it['quantity']
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=prod.id if prod else None,
-                product_sku=it['product_sku'],
-                variant=it.get('variant'),
-                quantity=it['quantity'],
-                unit_price=it['unit_price'],
-                subtotal=subtotal,
-                currency_code=it.get('currency_code') or first_currency,
-                account_id=default_acc_id
-            )
-            db.session.add(order_item)
+            line(order_id, product_ids.get(it['name']), it['product_sku'], it.get('variant'),
+                 it['quantity'], it['unit_price'], it['unit_price'] * it['quantity'],
+                 it.get('currency_code') or first_currency, acc['default'], order_date)
 
         # 2) shipping line (positive amount)
         ship_amt = od.get('shipping') or Decimal('0')
         if ship_amt and ship_amt != 0:
-            ship_item = OrderItem(
-                order_id=order.id,
-                product_id=None,
-                product_sku='SHIPPING',
-                variant=None,
-                quantity=1,
-                unit_price=ship_amt,
-                subtotal=ship_amt,
-                currency_code=first_currency,
-                account_id=ship_acc_id
-            )
-            db.session.add(ship_item)
+            line(order_id, None, 'SHIPPING', None, 1, ship_amt, ship_amt,
+                 first_currency, acc['shipping'], order_date)
 
         # 3) discount line (negative amount)
         disc_amt = od.get('discount_amount') or Decimal('0')
         if disc_amt and disc_amt != 0:
-            disc_item = OrderItem(
-                order_id=order.id,
-                product_id=None,
-                product_sku='DISCOUNT',
-                variant=None,
-                quantity=1,
-                unit_price=-disc_amt,
-                subtotal=-disc_amt,
-                currency_code=first_currency,
-                account_id=disc_acc_id
-            )
-            db.session.add(disc_item)
+            line(order_id, None, 'DISCOUNT', None, 1, -disc_amt, -disc_amt,
+                 first_currency, acc['discount'], order_date)
 
-        if order.payment_method == 'shopify':
+        if od['payment_method'] == 'shopify' and shopify:
             # --- Shopify Payments & Conversion Fees ---
             # 1) convert order total to CAD
-            cad_total = usd_to_cad(order.total_amount, order.order_date)
+            cad_total = usd_to_cad(od['order_total'], order_date)
 
             # 2) Shopify Payments fee: 3.5% of CAD + $0.30
             payment_fee = (cad_total * Decimal('0.035') + Decimal('0.30')) \
@@ -276,48 +342,180 @@ def perform_import(filepath):
             # 3) Currency Conversion fee: 2% of payment_fee
             conversion_fee = (cad_total * Decimal('0.02')).quantize(Decimal('0.01'))
 
-            # look up the “Shopify” provider once
-            shopify = Provider.query.filter_by(name='Shopify').first()
-            if shopify and (payment_fee or conversion_fee):
+            if payment_fee or conversion_fee:
                 total_fees = payment_fee + conversion_fee
+                # an expense-invoice for Shopify, linked to the order by its number
+                fee_rows.append({
+                    'provider_id': shopify.id,
+                    'invoice_date': order_date,
+                    'invoice_number': od['order_number'],
+                    'supplier_invoice': None,
+                    'total_amount': total_fees,
+                    **cad_fields(total_fees, shopify.currency_code, order_date)
+                })
+                fee_items.extend([
+                    (od['order_number'], acc['merchant'], 'Shopify Payments Fee', payment_fee, order_id, order_date),
+                    (od['order_number'], acc['conversion'], 'Currency Conversion Fee', conversion_fee, order_id, order_date),
+                ])
+
+    _insert_rows(OrderItem, item_rows)
+    # one fee invoice per order, numbered after it
+    fee_invoices = _insert_returning_ids(ExpenseInvoice, fee_rows, 'invoice_number')
+    _insert_rows(ExpenseItem, [
+        {
+            'expense_invoice_id': fee_invoices[number],
+            'account_id': account_id,
+            'description': description,
+            'amount': amount,
+            'currency_code': shopify.currency_code,
+            'order_id': order_id,
+            **cad_fields(amount, shopify.currency_code, on_date)
+        }
+        for number, account_id, description, amount, order_id, on_date in fee_items
+    ])
+
+    touched_customers = {row['customer_id'] for row in order_rows}
+    refresh_customer_stats(touched_customers)
+    index_orders(order_ids.values())
+    index_customers(touched_customers)
+    index_expense_invoices(fee_invoices.values())
+    return len(order_ids), {od['order_date'] for od in orders}
+
+
+def import_parsed_orders(orders):
+    """
+    Writes parsed orders (as yielded by iter_orders_csv) to DB: creates
+    customers, products, orders, order items, plus shipping & discount
+    line‐items in dedicated accounts.
+    Orders are written IMPORT_CHUNK_SIZE at a time, so memory stays flat
+    however large the export is; each chunk resolves its customers,
+    products and exchange rates once and is written with chunked bulk
+    INSERTs, the generated ids coming back through RETURNING. Everything is
+    committed together at the end.
+    Returns number of orders created.
+    Raises PeriodClosedError, rolling back and leaving the database
+    untouched, if an order falls in a closed period.
+    """
+    acc = _import_accounts()
+    shopify = Provider.query.filter_by(name='Shopify').first()
 
-                # create an expense‐invoice for Shopify
-                exp_inv = ExpenseInvoice(
-                    provider_id=shopify.id,
-                    invoice_date=order.order_date,
-                    invoice_number=order.order_number,  # link to the order
-                    supplier_invoice=None,  # you can set if available
-                    total_amount=total_fees
-                )
-                db.session.add(exp_inv)
-                db.session.flush()  # get exp_inv.id
-
-                # Merchant Fees line
-                db.session.add(ExpenseItem(
-                    expense_invoice_id=exp_inv.id,
-                    account_id=merchant_acc_id,  # your “Merchant Fees” account
-                    description='Shopify Payments Fee',
-                    amount=payment_fee,
-                    currency_code=shopify.currency_code,
-                    order_id=order.order_number
-                ))
-
-                # Currency Conversion Fees line
-                db.session.add(ExpenseItem(
-                    expense_invoice_id=exp_inv.id,
-                    account_id=conv_acc_id,  # your “Currency Conversion Fees” account
-                    description='Currency Conversion Fee',
-                    amount=conversion_fee,
-                    currency_code=shopify.currency_code,
-                    order_id=order.order_number
-                ))
-
-        created_count += 1
-
+    created_count = 0
+    touched_days = set()
+    orders = iter(orders)
+    try:
+        while chunk := list(islice(orders, IMPORT_CHUNK_SIZE)):
+            created, days = _import_chunk(chunk, acc, shopify)
+            created_count += created
+            touched_days |= days
+    except PeriodClosedError:
+        db.session.rollback()
+        raise
+
+    refresh_daily_totals(touched_days)
+    bump_data_version()
     db.session.commit()
     return created_count
 
 
+def perform_import(filepath):
+    """Streams the Shopify export at filepath into the DB; see import_parsed_orders."""
+    return import_parsed_orders(iter_orders_csv(filepath))
+
+
+def _parse_cursor(value):
+    """'YYYY-MM-DD_<id>' -> (date, id), or None when missing or malformed."""
+    try:
+        day, order_id = value.split('_')
+        return date.fromisoformat(day), int(order_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _cursor(row):
+    return f"{row.order_date.isoformat()}_{row.id}"
+
+
+def _range_totals(range_filter):
+    """
+    Totals over every order in the range, computed by aggregate queries:
+    order count, subtotal, shipping, total, CAD revenue, fees, COGS (order
+    currency) and COGS in CAD. Amounts without a materialized CAD value are
+    converted in the database; the rare groups no stored rate covers are
+    converted per (day, currency) in Python.
+    """
+    ranged = select(
+        Order.id,
+        Order.order_number,
+        Order.order_date,
+        Order.sub_total,
+        Order.shipping,
+        Order.total_amount,
+        Order.amount_cad,
+        sql_order_currency().label('currency_code')
+    )
+    if range_filter is not None:
+        ranged = ranged.where(range_filter)
+    ranged = ranged.subquery('ranged_orders')
+
+    def unresolved(query, cad, amount):
+        """Sum of `amount` converted in Python where the SQL conversion came back NULL."""
+        rows = db.session.execute(
+            query.add_columns(ranged.c.order_date, ranged.c.currency_code, func.sum(amount))
+            .where(cad.is_(None))
+            .group_by(ranged.c.order_date, ranged.c.currency_code)
+        ).all()
+        return sum(
+            (usd_to_cad(total, day) if currency != 'CAD' else total
+             for day, currency, total in rows if total),
+            Decimal('0')
+        )
+
+    # 1) order amounts
+    revenue_cad = sql_cad_amount(ranged.c.total_amount, ranged.c.currency_code,
+                                 ranged.c.order_date, ranged.c.amount_cad)
+    orders = db.session.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(ranged.c.sub_total), 0),
+            func.coalesce(func.sum(ranged.c.shipping), 0),
+            func.coalesce(func.sum(ranged.c.total_amount), 0),
+            func.coalesce(func.sum(revenue_cad), 0)
+        )
+    ).one()
+    total_cad = Decimal(orders[4]) + unresolved(select().select_from(ranged), revenue_cad, ranged.c.total_amount)
+
+    # 2) fees (stored in CAD) and COGS of those orders
+    is_fee = Account.name.in_(FEE_ACCOUNTS)
+    is_cogs = Account.name.in_(COGS_ACCOUNTS)
+    cogs_cad = sql_cad_amount(ExpenseItem.amount, ranged.c.currency_code,
+                              ranged.c.order_date, ExpenseItem.amount_cad)
+    costs = (
+        select()
+        .select_from(ExpenseItem)
+        .join(ranged, ExpenseItem.order_id == ranged.c.id)
+        .join(Account, ExpenseItem.account_id == Account.id)
+    )
+    fees, cogs, cogs_total_cad = db.session.execute(
+        costs.add_columns(
+            func.coalesce(func.sum(case((is_fee, ExpenseItem.amount), else_=0)), 0),
+            func.coalesce(func.sum(case((is_cogs, ExpenseItem.amount), else_=0)), 0),
+            func.coalesce(func.sum(case((is_cogs, cogs_cad), else_=0)), 0)
+        ).where(or_(is_fee, is_cogs))
+    ).one()
+    cogs_total_cad = Decimal(cogs_total_cad) + unresolved(costs.where(is_cogs), cogs_cad, ExpenseItem.amount)
+
+    return {
+        'total_orders': orders[0],
+        'total_sub': Decimal(orders[1]),
+        'total_shipping': Decimal(orders[2]),
+        'total_value': Decimal(orders[3]),
+        'total_cad': total_cad,
+        'total_fees': Decimal(fees),
+        'total_cogs_usd': Decimal(cogs),
+        'total_profit': total_cad - Decimal(cogs_total_cad) - Decimal(fees),
+    }
+
+
 @bp.route('/')
 def list_orders():
     # read filter params
@@ -328,10 +526,21 @@ def list_orders():
     start = datetime.fromisoformat(start_str).date() if start_str else None
     end = datetime.fromisoformat(end_str).date() if end_str else None
     start_date, end_date = get_date_range(range_key, start, end)
+    range_filter = Order.order_date.between(start_date, end_date) if start_date and end_date else None
 
-    # 1) Base query: aggregate orders, include a currency_code from OrderItem
+    per_page = min(
+        max(request.args.get('per_page', current_app.config.get('ORDERS_PAGE_SIZE', 50), type=int), 1),
+        MAX_ORDERS_PAGE_SIZE
+    )
+    after = _parse_cursor(request.args.get('after'))
+    before = None if after else _parse_cursor(request.args.get('before'))
+
+    # 1) One page of orders, newest first, by keyset on (order_date, id):
+    #    the page starts right after (or ends right before) the cursor row,
+    #    so its cost does not grow with the offset or the size of the range
     q = (
         db.session.query(
+            Order.id,
             Order.order_number,
             Order.order_date,
             Customer.name.label('customer_name'),
@@ -339,69 +548,88 @@ def list_orders():
             Order.shipping.label('shipping'),
             Order.total_amount.label('order_total'),
             Order.delivery_status,
-            func.coalesce(func.max(OrderItem.currency_code), 'USD').label('currency_code'),
+            sql_order_currency().label('currency_code'),
+            Order.amount_cad,
         )
         .join(Customer)
-        .outerjoin(OrderItem)
-        .group_by(Order.id)
-        .order_by(Order.order_date.desc())
     )
-    if start_date and end_date:
-        q = q.filter(Order.order_date.between(start_date, end_date))
-    stats = q.all()
+    if range_filter is not None:
+        q = q.filter(range_filter)
+    if after:
+        q = q.filter(or_(Order.order_date < after[0],
+                         and_(Order.order_date == after[0], Order.id < after[1])))
+        q = q.order_by(Order.order_date.desc(), Order.id.desc())
+    elif before:
+        q = q.filter(or_(Order.order_date > before[0],
+                         and_(Order.order_date == before[0], Order.id > before[1])))
+        q = q.order_by(Order.order_date.asc(), Order.id.asc())
+    else:
+        q = q.order_by(Order.order_date.desc(), Order.id.desc())
+    stats = q.limit(per_page + 1).all()
+    has_more = len(stats) > per_page
+    stats = stats[:per_page]
+    if before:
+        stats.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after is not None
+    prefetch_rates(row.order_date for row in stats
+                   if row.currency_code != 'CAD' and row.amount_cad is None)
 
-    # 2) Pull in fees (these are stored in CAD already)
-    fee_accounts = ['Merchant Fees', 'Currency Conversion Fees']
+    # 2) Pull in fees (these are stored in CAD already), for the page's orders only
+    page_orders = ExpenseItem.order_id.in_([row.id for row in stats])
     fee_rows = (
         db.session.query(
-            cast(ExpenseItem.order_id, String).label('order_number'),
+            ExpenseItem.order_id,
             func.coalesce(func.sum(ExpenseItem.amount), 0).label('fees')
         )
         .join(Account, ExpenseItem.account_id == Account.id)
-        .filter(Account.name.in_(fee_accounts))
-        .group_by(cast(ExpenseItem.order_id, String))
+        .filter(Account.name.in_(FEE_ACCOUNTS), page_orders)
+        .group_by(ExpenseItem.order_id)
         .all()
     )
-    fees_map = {row.order_number: row.fees for row in fee_rows}
+    fees_map = {row.order_id: row.fees for row in fee_rows}
 
-    # 3) Pull in COGS (these are stored in USD, will convert to CAD)
-    cogs_accounts = ['COGS', 'COGS Shipping', 'COGS Tax']
+    # 3) Pull in COGS (these are stored in USD, will convert to CAD), same orders
     cogs_rows = (
         db.session.query(
-            cast(ExpenseItem.order_id, String).label('order_number'),
-            func.coalesce(func.sum(ExpenseItem.amount), 0).label('cogs')
+            ExpenseItem.order_id,
+            func.coalesce(func.sum(ExpenseItem.amount), 0).label('cogs'),
+            func.sum(ExpenseItem.amount_cad).label('cogs_cad'),
+            (func.count(ExpenseItem.id) - func.count(ExpenseItem.amount_cad)).label('unconverted')
         )
         .join(Account, ExpenseItem.account_id == Account.id)
-        .filter(Account.name.in_(cogs_accounts))
-        .group_by(cast(ExpenseItem.order_id, String))
+        .filter(Account.name.in_(COGS_ACCOUNTS), page_orders)
+        .group_by(ExpenseItem.order_id)
         .all()
     )
-    cogs_map = {row.order_number: row.cogs for row in cogs_rows}
+    cogs_map = {row.order_id: row.cogs for row in cogs_rows}
+    # materialized CAD COGS, only where every line of the order has been converted
+    cogs_cad_map = {row.order_id: row.cogs_cad for row in cogs_rows if not row.unconverted}
 
-    # 4) Build a list of orders with all the columns we need
+    # 4) Build the page's rows with all the columns we need
     orders = []
-    total_sub = Decimal('0')
-    total_ship = Decimal('0')
-    total_val = Decimal('0')
-    total_fees = Decimal('0')
-    total_cogs_usd = Decimal('0')
-    total_cad = Decimal('0')
-    total_profit = Decimal('0')
-
-    for (order_number, order_date, customer_name,
+    for (order_id, order_number, order_date, customer_name,
          subtotal, shipping, order_total,
-         delivery_status, currency_code) in stats:
+         delivery_status, currency_code, amount_cad) in stats:
 
-        # lookup fees and cogs for this order_number
-        fees = fees_map.get(order_number, Decimal('0'))
-        cogs_usd = cogs_map.get(order_number, Decimal('0'))
+        # lookup fees and cogs for this order
+        fees = fees_map.get(order_id, Decimal('0'))
+        cogs_usd = cogs_map.get(order_id, Decimal('0'))
 
-        # compute revenue in CAD
-        if currency_code != 'CAD':
+        # compute revenue in CAD (materialized at import, converted for older rows)
+        if amount_cad is not None:
+            revenue_cad = amount_cad
+        elif currency_code != 'CAD':
             revenue_cad = usd_to_cad(order_total, order_date)
-            cogs_cad = usd_to_cad(cogs_usd, order_date)
         else:
             revenue_cad = order_total
+
+        if order_id in cogs_cad_map:
+            cogs_cad = cogs_cad_map[order_id]
+        elif currency_code != 'CAD':
+            cogs_cad = usd_to_cad(cogs_usd, order_date)
+        else:
             cogs_cad = cogs_usd
 
         # compute profit: revenue - cogs - fees (all in CAD)
@@ -428,35 +656,28 @@ def list_orders():
             'delivery_status': delivery_status,
         })
 
-        # accumulate sums
-        total_sub += subtotal
-        total_ship += shipping
-        total_val += order_total
-        total_fees += fees
-        total_cogs_usd += cogs_usd
-        total_cad += revenue_cad
-        total_profit += profit_cad
-
-    total_orders = len(orders)
-
-    # Calculate average margin
-    if total_cad and total_cad != 0:
-        avg_margin = (total_profit / total_cad * Decimal('100')).quantize(Decimal('0.01'))
+    # 5) Range totals, from aggregate queries rather than the page
+    totals = _range_totals(range_filter)
+    if totals['total_cad']:
+        avg_margin = (totals['total_profit'] / totals['total_cad'] * Decimal('100')).quantize(Decimal('0.01'))
     else:
         avg_margin = None
 
+    params = {k: v for k, v in {
+        'range': range_key,
+        'start': start_str,
+        'end': end_str,
+        'per_page': request.args.get('per_page'),
+    }.items() if v}
     return render_template(
         'orders/list.html',
         orders=orders,
-        total_orders=total_orders,
-        total_sub=total_sub,
-        total_shipping=total_ship,
-        total_value=total_val,
-        total_fees=total_fees,
-        total_cogs_usd=total_cogs_usd,
-        total_cad=total_cad,
-        total_profit=total_profit,
+        **totals,
         avg_margin=avg_margin,
+        per_page=per_page,
+        next_cursor=_cursor(stats[-1]) if has_next and stats else None,
+        prev_cursor=_cursor(stats[0]) if has_prev and stats else None,
+        params=params,
         range_key=range_key,
         start_date=start_date,
         end_date=end_date
@@ -478,14 +699,11 @@ def import_orders():
             return redirect(url_for('orders.import_orders'))
 
         # save the uploaded file
-        upload_dir = os.path.join(current_app.root_path, 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        file_key = f"{uuid.uuid4().hex}.csv"
-        file_path = os.path.join(upload_dir, file_key)
-        uploaded.save(file_path)
+        file_key, file_path = save_upload(uploaded)
 
-        # parse CSV for verification
+        # parse CSV for verification, then stage the new orders for confirm
         customers, products, new_orders, updates_data = parse_orders_csv(file_path)
+        stage(file_key, 'orders', new_orders.values())
 
         return render_template(
             'orders/verify.html',
@@ -507,14 +725,19 @@ def confirm_import():
         flash('No import in progress.', 'warning')
         return redirect(url_for('orders.import_orders'))
 
-    upload_dir = os.path.join(current_app.root_path, 'uploads')
-    file_path = os.path.join(upload_dir, file_key)
-    if not os.path.exists(file_path):
+    staged = load_stage(file_key, 'orders')
+    if staged is None:
         flash('Import session expired. Please re-upload.', 'warning')
         return redirect(url_for('orders.import_orders'))
 
-    created = perform_import(file_path)
-    os.remove(file_path)
+    # write the orders parsed on upload; nothing is parsed again
+    _, orders = staged
+    try:
+        created = import_parsed_orders(orders)
+    except PeriodClosedError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('orders.import_orders'))
+    discard(file_key)
 
     flash(f'Successfully imported {created} new orders!', 'success')
     return redirect(url_for('orders.list_orders'))
@@ -526,7 +749,7 @@ def show_order(order_number):
     order = Order.query.filter_by(order_number=order_number).first_or_404()
 
     # Fetch any expense‐items linked to this order
-    expense_items = ExpenseItem.query.filter_by(order_id=order.order_number).all()
+    expense_items = ExpenseItem.query.filter_by(order_id=order.id).all()
 
     # 3) Determine order currency from first line‐item (fallback to USD)
     first_item = order.items[0] if order.items else None
@@ -549,8 +772,14 @@ def show_order(order_number):
             fees_cad += amt
 
     # compute COGS, Profit and Margin
-    revenue_cad = usd_to_cad(order.total_amount, order.order_date)
-    profit_cad = revenue_cad - usd_to_cad(cogs_usd, order.order_date) - fees_cad
+    rate = order.rate_used or cad_rate(order_currency, order.order_date)
+    revenue_cad = order.amount_cad if order.amount_cad is not None else usd_to_cad(order.total_amount, order.order_date)
+    cogs_items = [exp for exp in expense_items if exp.account and exp.account.name in cogs_names]
+    if all(exp.amount_cad is not None for exp in cogs_items):
+        cogs_cad = sum((exp.amount_cad for exp in cogs_items), Decimal('0'))
+    else:
+        cogs_cad = usd_to_cad(cogs_usd, order.order_date)
+    profit_cad = revenue_cad - cogs_cad - fees_cad
 
     if order.total_amount and order.total_amount != 0:
         margin = (profit_cad / revenue_cad * Decimal('100')).quantize(Decimal('0.01'))
@@ -562,6 +791,9 @@ def show_order(order_number):
         order=order,
         expense_items=expense_items,
         cogs_usd=cogs_usd,
+        cogs_cad=cogs_cad,
+        cad_rate=rate,
+        revenue_cad=revenue_cad,
         fees_cad=fees_cad,
         profit_cad=profit_cad,
         margin=margin
@@ -1,9 +1,23 @@
-from flask import Blueprint, render_template, url_for, redirect, flash
-from sqlalchemy import func
-from ..models import db, Product, OrderItem
+from datetime import datetime
+
+from flask import Blueprint, render_template, url_for, redirect, flash, request
+from sqlalchemy import func, case, cast, select, null, Float
+from ..models import db, Product, Order, OrderItem, ExpenseInvoice, ExpenseItem, Account
+from ..utils.cad_amounts import sql_cad_amount
+from ..utils.date_filters import get_date_range
 
 bp = Blueprint('products', __name__, template_folder='templates/products')
 
+COGS_ACCOUNTS = ['COGS', 'COGS Shipping', 'COGS Tax']
+FEE_ACCOUNTS = ['Merchant Fees', 'Currency Conversion Fees']
+# order lines that are not products; they carry no COGS share
+NON_PRODUCT_SKUS = ['SHIPPING', 'DISCOUNT']
+
+PROFITABILITY_GROUPS = ['product', 'sku', 'variant']
+PROFITABILITY_SORTS = ['margin', 'profit', 'revenue', 'cogs', 'fees', 'quantity', 'name']
+PROFITABILITY_PAGE_SIZE = 50
+PROFITABILITY_MAX_PAGE_SIZE = 500
+
 @bp.route('/')
 def list_products():
     # For each product, sum up quantities sold (0 if none)
@@ -24,6 +38,169 @@ def list_products():
         total_products=total_products
     )
 
+def _group_columns(group):
+    """(name, sku, variant) columns shown for a grouping level, and the columns grouped by."""
+    if group == 'sku':
+        shown = [func.max(Product.name), OrderItem.product_sku, null()]
+        keys = [OrderItem.product_sku]
+    elif group == 'variant':
+        shown = [Product.name, func.max(OrderItem.product_sku), OrderItem.variant]
+        keys = [OrderItem.product_id, Product.name, OrderItem.variant]
+    else:
+        shown = [Product.name, null(), null()]
+        keys = [OrderItem.product_id, Product.name]
+    return [col.label(name) for col, name in zip(shown, ['name', 'sku', 'variant'])], keys
+
+def profitability_query(start_date, end_date, group='product'):
+    """
+    Grouped statement of revenue, allocated COGS and fees, profit and margin
+    (all CAD) per product, SKU or product variant.
+    Each order's COGS and fees are spread over its product lines in
+    proportion to their share of the order's product revenue, so nothing is
+    loaded into Python per order: one subquery sums the costs per order, one
+    sums the product revenue per order, and the outer query weights and
+    groups the lines. Rows whose CAD amount is not materialized yet are
+    converted in SQL.
+    """
+    in_range = Order.order_date.between(start_date, end_date) if start_date and end_date else None
+    product_line = OrderItem.product_sku.notin_(NON_PRODUCT_SKUS)
+    line_cad = sql_cad_amount(OrderItem.subtotal, OrderItem.currency_code, Order.order_date, OrderItem.amount_cad)
+    expense_cad = sql_cad_amount(ExpenseItem.amount, ExpenseItem.currency_code, ExpenseInvoice.invoice_date,
+                                 ExpenseItem.amount_cad)
+
+    # 1) COGS and fees per order
+    costs = (
+        select(
+            Order.id.label('order_id'),
+            func.sum(case((Account.name.in_(COGS_ACCOUNTS), expense_cad), else_=0)).label('cogs'),
+            func.sum(case((Account.name.in_(FEE_ACCOUNTS), expense_cad), else_=0)).label('fees')
+        )
+        .join(ExpenseItem, ExpenseItem.order_id == Order.id)
+        .join(ExpenseInvoice, ExpenseItem.expense_invoice_id == ExpenseInvoice.id)
+        .join(Account, ExpenseItem.account_id == Account.id)
+        .where(Account.name.in_(COGS_ACCOUNTS + FEE_ACCOUNTS))
+        .group_by(Order.id)
+    )
+    # 2) product revenue per order, the allocation base
+    order_revenue = (
+        select(OrderItem.order_id, func.sum(line_cad).label('revenue'))
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(product_line)
+        .group_by(OrderItem.order_id)
+    )
+    if in_range is not None:
+        costs = costs.where(in_range)
+        order_revenue = order_revenue.where(in_range)
+    costs = costs.subquery('order_costs')
+    order_revenue = order_revenue.subquery('order_revenue')
+
+    # 3) weight each line by its share of the order and group
+    share = cast(line_cad, Float) / func.nullif(cast(order_revenue.c.revenue, Float), 0)
+    revenue = func.coalesce(func.sum(line_cad), 0)
+    cogs = func.coalesce(func.sum(share * costs.c.cogs), 0)
+    fees = func.coalesce(func.sum(share * costs.c.fees), 0)
+    profit = revenue - cogs - fees
+    shown, keys = _group_columns(group)
+    stmt = (
+        select(
+            *shown,
+            func.sum(OrderItem.quantity).label('quantity'),
+            cast(revenue, db.Numeric(12, 2)).label('revenue'),
+            cast(cogs, db.Numeric(12, 2)).label('cogs'),
+            cast(fees, db.Numeric(12, 2)).label('fees'),
+            cast(profit, db.Numeric(12, 2)).label('profit'),
+            cast(profit * 100.0 / func.nullif(revenue, 0), db.Numeric(12, 2)).label('margin')
+        )
+        .select_from(OrderItem)
+        .join(Order, OrderItem.order_id == Order.id)
+        .outerjoin(Product, OrderItem.product_id == Product.id)
+        .join(order_revenue, order_revenue.c.order_id == OrderItem.order_id)
+        .outerjoin(costs, costs.c.order_id == OrderItem.order_id)
+        .where(product_line)
+        .group_by(*keys)
+    )
+    if in_range is not None:
+        stmt = stmt.where(in_range)
+    return stmt, keys
+
+@bp.route('/profitability')
+def profitability():
+    # 1) filters, grouping, sorting and paging from the query string
+    range_key = request.args.get('range', 'this_year')
+    start_str = request.args.get('start')
+    end_str = request.args.get('end')
+    start = datetime.fromisoformat(start_str).date() if start_str else None
+    end = datetime.fromisoformat(end_str).date() if end_str else None
+    start_date, end_date = get_date_range(range_key, start, end)
+
+    group = request.args.get('group', 'product')
+    if group not in PROFITABILITY_GROUPS:
+        group = 'product'
+    sort = request.args.get('sort', 'margin')
+    if sort not in PROFITABILITY_SORTS:
+        sort = 'margin'
+    direction = 'asc' if request.args.get('dir') == 'asc' else 'desc'
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', PROFITABILITY_PAGE_SIZE, type=int), 1),
+                   PROFITABILITY_MAX_PAGE_SIZE)
+
+    # 2) range totals and the row count in one pass over the grouped rows
+    stmt, keys = profitability_query(start_date, end_date, group)
+    grouped = stmt.subquery('profitability')
+    count, revenue, cogs, fees, profit = db.session.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(grouped.c.revenue), 0),
+            func.coalesce(func.sum(grouped.c.cogs), 0),
+            func.coalesce(func.sum(grouped.c.fees), 0),
+            func.coalesce(func.sum(grouped.c.profit), 0)
+        ).select_from(grouped)
+    ).one()
+    totals = {
+        'revenue': revenue,
+        'cogs': cogs,
+        'fees': fees,
+        'profit': profit,
+        'margin': round(profit * 100 / revenue, 2) if revenue else None,
+    }
+
+    # 3) one sorted page, ordered and cut in the database
+    sort_col = stmt.selected_columns[sort]
+    sort_col = sort_col.asc() if direction == 'asc' else sort_col.desc()
+    rows = db.session.execute(
+        stmt.order_by(sort_col.nulls_last(), *keys)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    pages = max((count + per_page - 1) // per_page, 1)
+
+    params = {
+        'range': range_key,
+        'start': start_str,
+        'end': end_str,
+        'group': group,
+        'sort': sort,
+        'dir': direction,
+        'per_page': per_page,
+    }
+    return render_template(
+        'products/profitability.html',
+        rows=rows,
+        totals=totals,
+        count=count,
+        page=page,
+        pages=pages,
+        per_page=per_page,
+        group=group,
+        sort=sort,
+        direction=direction,
+        params={k: v for k, v in params.items() if v},
+        filter_params={'group': group, 'sort': sort, 'dir': direction, 'per_page': per_page},
+        range_key=range_key,
+        start_date=start_date,
+        end_date=end_date
+    )
+
 @bp.route('/new')
 def create_product():
     flash('Product creation not implemented yet', 'info')
@@ -32,4 +209,4 @@ def create_product():
 @bp.route('/import')
 def import_products():
     flash('Product import not implemented yet', 'info')
-    return redirect(url_for('products.list_products'))
\ No newline at end of file
+    return redirect(url_for('products.list_products'))
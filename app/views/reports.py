@@ -1,13 +1,29 @@
+import csv
+import hashlib
+import io
 from decimal import Decimal
-from flask import Blueprint, render_template, request
-from datetime import datetime, timedelta
-from sqlalchemy import func, or_, extract, case
-from ..models import db, Account, Order, OrderItem, ExpenseInvoice, ExpenseItem
+from flask import Blueprint, render_template, request, Response, stream_with_context, jsonify
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, func, or_, extract, case, select
+from sqlalchemy.orm import aliased
+from ..models import db, Account, AccountClosure, Order
 from ..utils.date_filters import get_date_range
-from ..utils.currency import usd_to_cad
+from ..utils.balances import balances_as_of
+from ..utils.date_buckets import BUCKETS, period_bucket
+from ..utils.ledger import ledger_query
+from ..utils.periods import totals_source
+from ..utils.data_version import current_data_version
+from ..utils.report_cache import report_cache
 
 bp = Blueprint('reports', __name__, template_folder='templates/reports')
 
+PL_ACCOUNT_TYPES = ['Income', 'COGS', 'Expense', 'Fees']
+PL_SECTIONS = {'Income': 'Income', 'COGS': 'COGS', 'Expense': 'Expenses', 'Fees': 'Expenses'}
+BALANCE_TYPES = ['Income', 'COGS', 'Expense', 'Fees', 'Service', 'Other']
+
+# rows fetched from the database and written to the response per chunk
+CSV_CHUNK_SIZE = 1000
+
 def get_period_columns(start_date, end_date, granularity):
     """Generate column headers for the selected time granularity"""
     columns = []
@@ -38,93 +54,186 @@ def get_period_columns(start_date, end_date, granularity):
                 'label': month_start.strftime('%b %Y'),
                 'date': month_start
             })
-            # Move to next month
+            # Move to next month (from the 1st, so a start on the 31st can't overflow)
             if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1)
+                current = month_start.replace(year=current.year + 1, month=1)
             else:
-                current = current.replace(month=current.month + 1)
+                current = month_start.replace(month=current.month + 1)
     
     return columns
 
+def period_expression(column, granularity):
+    """Get SQLAlchemy expression for grouping a date column by granularity"""
+    # compiles to strftime on SQLite and date_trunc/to_char on PostgreSQL
+    return period_bucket(column, granularity)
+
 def get_date_grouping(granularity):
-    """Get SQLAlchemy expression for grouping dates by granularity"""
-    if granularity == 'day':
-        return func.strftime('%Y-%m-%d', Order.order_date)
-    elif granularity == 'week':
-        # Use the same date format as the column keys
-        return func.strftime('%Y-%m-%d', Order.order_date)
-    elif granularity == 'month':
-        # SQLite: group by month using strftime
-        return func.strftime('%Y-%m', Order.order_date)
-    else:
-        return func.strftime('%Y-%m-%d', Order.order_date)
-
-def get_expense_date_grouping(granularity):
-    """Get SQLAlchemy expression for grouping expense dates by granularity"""
-    if granularity == 'day':
-        return func.strftime('%Y-%m-%d', ExpenseInvoice.invoice_date)
-    elif granularity == 'week':
-        # Use the same date format as the column keys
-        return func.strftime('%Y-%m-%d', ExpenseInvoice.invoice_date)
-    elif granularity == 'month':
-        # SQLite: group by month using strftime
-        return func.strftime('%Y-%m', ExpenseInvoice.invoice_date)
-    else:
-        return func.strftime('%Y-%m-%d', ExpenseInvoice.invoice_date)
+    """Get SQLAlchemy expression for grouping order dates by granularity"""
+    return period_expression(Order.order_date, granularity)
 
-@bp.route('/pl')
-def pl_report():
-    # 1) Date‐range filter
-    range_key = request.args.get('range', 'this_month')
-    start_str = request.args.get('start')
-    end_str   = request.args.get('end')
-    granularity = request.args.get('granularity', 'month')  # day, week, month
+def _pl_query(totals, rollup, *values, rollup_to=None):
+    """
+    Query of (account type, account id, account name, *values) over the daily
+    totals (`totals`, see totals_source) of the P&L accounts. With `rollup`
+    the id and name are those of the top-level ancestor; with `rollup_to`
+    (an account id) every account of that account's subtree is reported as
+    that account and the others as themselves. Both go through the account
+    closure table.
+    Returns the query and the key columns to group by.
+    """
+    shown = aliased(Account) if rollup or rollup_to is not None else Account
+    keys = [Account.type, shown.id, shown.name]
+    q = (
+        db.session.query(*keys, *values)
+        .select_from(totals)
+        .join(Account, totals.c.account_id == Account.id)
+        .filter(Account.type.in_(PL_ACCOUNT_TYPES))
+    )
+    if rollup_to is not None:
+        q = (
+            q.outerjoin(AccountClosure, and_(AccountClosure.descendant_id == Account.id,
+                                             AccountClosure.ancestor_id == rollup_to))
+            .join(shown, shown.id == func.coalesce(AccountClosure.ancestor_id, Account.id))
+        )
+    elif rollup:
+        q = (
+            q.join(AccountClosure, AccountClosure.descendant_id == Account.id)
+            .join(shown, AccountClosure.ancestor_id == shown.id)
+            .filter(shown.parent_id.is_(None))
+        )
+    return q, keys
 
-    start = datetime.fromisoformat(start_str).date() if start_str else None
-    end   = datetime.fromisoformat(end_str).date()   if end_str   else None
-    start_date, end_date = get_date_range(range_key, start, end)
+def comparison_ranges(start_date, end_date):
+    """
+    {'current', 'previous', 'last_year'} date ranges for a comparison: the
+    equally long span right before the range, and the same dates a year
+    earlier (29 February maps to the 28th).
+    """
+    length = end_date - start_date
+    previous_end = start_date - timedelta(days=1)
+
+    def year_back(day):
+        try:
+            return day.replace(year=day.year - 1)
+        except ValueError:
+            return day.replace(year=day.year - 1, day=28)
+
+    return {
+        'current': (start_date, end_date),
+        'previous': (previous_end - length, previous_end),
+        'last_year': (year_back(start_date), year_back(end_date)),
+    }
+
+def _delta(current, other):
+    change = current - other
+    pct = (change / abs(other) * 100).quantize(Decimal('0.1')) if other else None
+    return change, pct
+
+def build_pl_comparison(start_date, end_date, rollup=False, rollup_to=None):
+    """
+    Per-account totals for the range, the previous period and the same
+    period last year, with deltas. All three come from one grouped query
+    over the daily totals: the filter covers the three spans and each sum
+    is a CASE on its own span.
+    """
+    ranges = comparison_ranges(start_date, end_date)
+    t = totals_source()
+    sums = [
+        func.sum(case((t.c.day.between(lo, hi), t.c.amount_cad), else_=0)).label(name)
+        for name, (lo, hi) in ranges.items()
+    ]
+    q, keys = _pl_query(t, rollup, *sums, rollup_to=rollup_to)
+    rows = (
+        q.filter(or_(*(t.c.day.between(lo, hi) for lo, hi in ranges.values())))
+        .group_by(*keys)
+        .all()
+    )
+
+    zero = {name: Decimal('0') for name in ranges}
+    sections = {'Income': {}, 'COGS': {}, 'Expenses': {}}
+    for acc_type, acc_id, acc_name, *values in rows:
+        accounts = sections[PL_SECTIONS[acc_type]]
+        totals = accounts.setdefault((acc_id, acc_name), dict(zero))
+        for name, value in zip(ranges, values):
+            totals[name] += Decimal(value or 0)
+
+    def line(name, totals, acc_id=None):
+        delta_prev, pct_prev = _delta(totals['current'], totals['previous'])
+        delta_ly, pct_ly = _delta(totals['current'], totals['last_year'])
+        return {
+            'id': acc_id,
+            'name': name,
+            **totals,
+            'delta_previous': delta_prev,
+            'pct_previous': pct_prev,
+            'delta_last_year': delta_ly,
+            'pct_last_year': pct_ly,
+        }
 
-    # Generate period columns
+    result = {'ranges': ranges, 'sections': [], 'totals': {}}
+    section_totals = {}
+    for section, accounts in sections.items():
+        totals = {
+            name: sum((acc[name] for acc in accounts.values()), Decimal('0'))
+            for name in ranges
+        }
+        section_totals[section] = totals
+        result['sections'].append({
+            'name': section,
+            'accounts': [
+                line(acc_name, accounts[(acc_id, acc_name)], acc_id)
+                for acc_id, acc_name in sorted(accounts, key=lambda key: key[1])
+            ],
+            'total': line(f'Total {section}', totals),
+        })
+    gross = {
+        name: section_totals['Income'][name] - section_totals['COGS'][name]
+        for name in ranges
+    }
+    net = {name: gross[name] - section_totals['Expenses'][name] for name in ranges}
+    result['totals'] = {
+        'gross_profit': line('Gross Profit', gross),
+        'net_profit': line('Net Profit', net),
+    }
+    return result
+
+def build_pl(start_date, end_date, granularity, rollup=False, rollup_to=None):
+    """
+    Compute the P&L between two dates at the given granularity.
+    With `rollup`, each top-level account carries the totals of its whole
+    subtree (through the account closure table) instead of listing every
+    sub-account; with `rollup_to`, only the given account does.
+    Returns the template context: period_columns, income, cogs, expenses,
+    period_totals and order_counts_by_period.
+    """
+    # 1) Generate period columns
     period_columns = get_period_columns(start_date, end_date, granularity)
     
-    # 2) Income — fetch every OrderItem grouped by period
-    income_query = (
-        db.session.query(
-            Account.name,
-            get_date_grouping(granularity).label('period'),
-            func.sum(OrderItem.subtotal).label('amount'),
-            OrderItem.currency_code,
-            Order.order_date.label('order_date')  # Get actual order date for each row
-        )
-        .join(Account, OrderItem.account_id==Account.id)
-        .join(Order, OrderItem.order_id==Order.id)
-        .filter(Account.type=='Income')
-        .filter(Order.order_date.between(start_date, end_date))
-        .group_by(Account.name, get_date_grouping(granularity), OrderItem.currency_code, Order.order_date)
+    # 2) Income, COGS and Expenses/Fees — rolled up from the daily account
+    #    totals, live and frozen
+    t = totals_source()
+    period = period_expression(t.c.day, granularity)
+    q, keys = _pl_query(t, rollup, period.label('period'), func.sum(t.c.amount_cad), rollup_to=rollup_to)
+    pl_rows = (
+        q.filter(t.c.day.between(start_date, end_date))
+        .group_by(*keys, period)
         .all()
     )
 
-    # Process income data into period columns
+    # Process ledger totals into period columns per section
     income_data = {}
-    for acc_name, period, amt, curr, order_date in income_query:
-        if acc_name not in income_data:
-            income_data[acc_name] = {}
-        
-        # Convert to CAD using the actual order date
-        cad = usd_to_cad(amt, order_date) if curr != 'CAD' else amt
-        
-        # For weekly granularity, map the date to the week start date
-        if granularity == 'week':
-            # Convert period string back to date, then find week start
-            period_date = datetime.strptime(period, '%Y-%m-%d').date()
-            week_start = period_date - timedelta(days=period_date.weekday())
-            period_key = week_start.strftime('%Y-%m-%d')
+    cogs_data = {}
+    exp_data = {}
+    for acc_type, acc_id, acc_name, period, cad in pl_rows:
+        if acc_type == 'Income':
+            periods = income_data.setdefault(acc_name, {})
+        elif acc_type == 'COGS':
+            periods = cogs_data.setdefault(acc_name, {})
         else:
-            period_key = period
-            
-        income_data[acc_name][period_key] = income_data[acc_name].get(period_key, Decimal('0')) + cad
+            periods = exp_data.setdefault((acc_id, acc_name), {})
+        periods[period] = periods.get(period, Decimal('0')) + cad
 
-    # Order counts query
+    # 3) Order counts query
     order_count_query = (
         db.session.query(
             get_date_grouping(granularity).label('period'),
@@ -136,89 +245,7 @@ def pl_report():
     )
 
     # Process order count data
-    order_counts_by_period = {}
-    for period, count in order_count_query:
-        if granularity == 'week':
-            period_date = datetime.strptime(period, '%Y-%m-%d').date()
-            week_start = period_date - timedelta(days=period_date.weekday())
-            period_key = week_start.strftime('%Y-%m-%d')
-            order_counts_by_period[period_key] = order_counts_by_period.get(period_key, 0) + count
-        else:
-            order_counts_by_period[period] = count
-
-    # 3) COGS — all ExpenseItems grouped by period
-    cogs_query = (
-        db.session.query(
-            Account.name,
-            get_expense_date_grouping(granularity).label('period'),
-            func.sum(ExpenseItem.amount).label('amount'),
-            ExpenseItem.currency_code,
-            ExpenseInvoice.invoice_date.label('invoice_date')  # Get actual invoice date for each row
-        )
-        .join(Account, ExpenseItem.account_id==Account.id)
-        .join(ExpenseInvoice, ExpenseItem.expense_invoice_id==ExpenseInvoice.id)
-        .filter(Account.type=='COGS')
-        .filter(ExpenseInvoice.invoice_date.between(start_date, end_date))
-        .group_by(Account.name, get_expense_date_grouping(granularity), ExpenseItem.currency_code, ExpenseInvoice.invoice_date)
-        .all()
-    )
-
-    # Process COGS data
-    cogs_data = {}
-    for acc_name, period, amt, curr, invoice_date in cogs_query:
-        if acc_name not in cogs_data:
-            cogs_data[acc_name] = {}
-        
-        # Convert to CAD using the actual invoice date
-        cad = usd_to_cad(amt, invoice_date) if curr != 'CAD' else amt
-        
-        # For weekly granularity, map the date to the week start date
-        if granularity == 'week':
-            period_date = datetime.strptime(period, '%Y-%m-%d').date()
-            week_start = period_date - timedelta(days=period_date.weekday())
-            period_key = week_start.strftime('%Y-%m-%d')
-        else:
-            period_key = period
-            
-        cogs_data[acc_name][period_key] = cogs_data[acc_name].get(period_key, Decimal('0')) + cad
-
-    # 4) Expenses — all ExpenseItems grouped by period
-    exp_query = (
-        db.session.query(
-            Account.id.label('account_id'),
-            Account.name,
-            get_expense_date_grouping(granularity).label('period'),
-            func.sum(ExpenseItem.amount).label('amount'),
-            ExpenseItem.currency_code,
-            ExpenseInvoice.invoice_date.label('invoice_date')  # Get actual invoice date for each row
-        )
-        .join(Account, ExpenseItem.account_id==Account.id)
-        .join(ExpenseInvoice, ExpenseItem.expense_invoice_id==ExpenseInvoice.id)
-        .filter(Account.type.in_(['Expense', 'Fees']))
-        .filter(ExpenseInvoice.invoice_date.between(start_date, end_date))
-        .group_by(Account.id, Account.name, get_expense_date_grouping(granularity), ExpenseItem.currency_code, ExpenseInvoice.invoice_date)
-        .all()
-    )
-
-    # Process expense data
-    exp_data = {}
-    for acc_id, acc_name, period, amt, curr, invoice_date in exp_query:
-        key = (acc_id, acc_name)
-        if key not in exp_data:
-            exp_data[key] = {}
-        
-        # Convert to CAD using the actual invoice date
-        cad = usd_to_cad(amt, invoice_date) if curr != 'CAD' else amt
-        
-        # For weekly granularity, map the date to the week start date
-        if granularity == 'week':
-            period_date = datetime.strptime(period, '%Y-%m-%d').date()
-            week_start = period_date - timedelta(days=period_date.weekday())
-            period_key = week_start.strftime('%Y-%m-%d')
-        else:
-            period_key = period
-            
-        exp_data[key][period_key] = exp_data[key].get(period_key, Decimal('0')) + cad
+    order_counts_by_period = {period: count for period, count in order_count_query}
 
     # Calculate totals for each period
     period_totals = {
@@ -288,16 +315,253 @@ def pl_report():
         for (acc_id, acc_name) in sorted(exp_data.keys(), key=lambda x: x[1])
     ]
 
+    return {
+        'period_columns': period_columns,
+        'income': income,
+        'cogs': cogs,
+        'expenses': expenses,
+        'period_totals': period_totals,
+        'order_counts_by_period': order_counts_by_period,
+    }
+
+def _request_range():
+    """(range_key, start_date, end_date, granularity) from the query string."""
+    range_key = request.args.get('range', 'this_month')
+    start_str = request.args.get('start')
+    end_str   = request.args.get('end')
+    granularity = request.args.get('granularity', 'month')  # day, week, month
+
+    start = datetime.fromisoformat(start_str).date() if start_str else None
+    end   = datetime.fromisoformat(end_str).date()   if end_str   else None
+    start_date, end_date = get_date_range(range_key, start, end)
+    return range_key, start_date, end_date, granularity
+
+def _stream_csv(filename, header, rows):
+    """
+    Stream `rows` (any iterable, typically a database cursor) as a CSV download.
+    Rows are encoded in chunks of CSV_CHUNK_SIZE, so memory stays flat and the
+    first bytes go out before the query has been fully read.
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for idx, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if idx % CSV_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def _cached_pl(range_key, start_date, end_date, granularity, rollup, rollup_to, compare):
+    """build_pl() (plus the comparison when asked for) through the report cache."""
+    def compute():
+        pl = build_pl(start_date, end_date, granularity, rollup, rollup_to)
+        pl['comparison'] = build_pl_comparison(start_date, end_date, rollup, rollup_to) if compare else None
+        return pl
+
+    return report_cache().get_or_compute(
+        ('pl', range_key, start_date, end_date, granularity, rollup, rollup_to, compare),
+        compute
+    )
+
+@bp.route('/pl')
+def pl_report():
+    # 1) Date‐range filter
+    range_key, start_date, end_date, granularity = _request_range()
+    rollup = request.args.get('rollup') == '1'
+    rollup_to = request.args.get('rollup_to', type=int)
+    compare = request.args.get('compare') == '1'
+
+    # 2) Served from the report cache until the next write bumps the data version
+    pl = _cached_pl(range_key, start_date, end_date, granularity, rollup, rollup_to, compare)
+
+    # 3) accounts with sub-accounts, for the "roll up to" selector
+    parent_accounts = Account.query.filter(Account.children.any()).order_by(Account.name).all()
+
     return render_template(
         'reports/pl.html',
         range_key=range_key,
         start_date=start_date,
         end_date=end_date,
         granularity=granularity,
-        period_columns=period_columns,
-        income=income,
-        cogs=cogs,
-        expenses=expenses,
-        period_totals=period_totals,
-        order_counts_by_period=order_counts_by_period
+        rollup=rollup,
+        rollup_to=rollup_to,
+        parent_accounts=parent_accounts,
+        compare=compare,
+        **pl
+    )
+
+def _json_ready(value):
+    """Recursively turn a report structure into JSON types: Decimal as string, dates as ISO strings."""
+    if isinstance(value, dict):
+        return {str(key): _json_ready(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_ready(item) for item in value]
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+@bp.route('/api/pl')
+def pl_api():
+    """
+    The P&L as JSON, with the same structure the HTML report is built from.
+    The ETag is derived from the data version and the request parameters,
+    so a poll with a matching If-None-Match is answered with 304 before any
+    report query runs. Ranges without both bounds (all time, or custom with
+    a missing date) and unknown granularities are answered with 400.
+    """
+    try:
+        range_key, start_date, end_date, granularity = _request_range()
+    except ValueError:
+        return jsonify(error='start and end must be dates (YYYY-MM-DD).'), 400
+    if start_date is None or end_date is None:
+        return jsonify(error=f"Range '{range_key}' has no start and end date; "
+                             "use a named range or range=custom with start and end."), 400
+    if granularity not in BUCKETS:
+        return jsonify(error=f"Unknown granularity '{granularity}'; use one of {', '.join(BUCKETS)}."), 400
+    rollup = request.args.get('rollup') == '1'
+    rollup_to = request.args.get('rollup_to', type=int)
+    compare = request.args.get('compare') == '1'
+    version = current_data_version()
+    etag = hashlib.sha1(
+        f'{version}:{range_key}:{start_date}:{end_date}:{granularity}:{rollup}:{rollup_to}:{compare}'.encode()
+    ).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        pl = _cached_pl(range_key, start_date, end_date, granularity, rollup, rollup_to, compare)
+        response = jsonify(_json_ready({
+            'range': range_key,
+            'start_date': start_date,
+            'end_date': end_date,
+            'granularity': granularity,
+            'rollup': rollup,
+            'rollup_to': rollup_to,
+            'compare': compare,
+            'data_version': version,
+            **pl
+        }))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/pl.csv')
+def pl_csv():
+    """P&L in long format: one row per period, section and account."""
+    range_key, start_date, end_date, granularity = _request_range()
+
+    t = totals_source()
+    period = period_expression(t.c.day, granularity)
+    query = (
+        select(
+            period.label('period'),
+            Account.type,
+            Account.name,
+            func.sum(t.c.amount_cad)
+        )
+        .select_from(t)
+        .join(Account, t.c.account_id == Account.id)
+        .where(Account.type.in_(PL_ACCOUNT_TYPES))
+        .group_by(period, Account.type, Account.id, Account.name)
+        .order_by(period, Account.type, Account.name)
+    )
+    if start_date and end_date:
+        query = query.where(t.c.day.between(start_date, end_date))
+
+    def rows():
+        result = db.session.execute(query.execution_options(yield_per=CSV_CHUNK_SIZE))
+        for period_key, acc_type, acc_name, cad in result:
+            yield period_key, PL_SECTIONS[acc_type], acc_name, cad
+
+    return _stream_csv(
+        f'pl_{granularity}_{start_date or "all"}_{end_date or "all"}.csv',
+        ['period', 'section', 'account', 'amount_cad'],
+        rows()
+    )
+
+@bp.route('/ledger.csv')
+def ledger_csv():
+    """Every order and expense line in the date range, oldest first."""
+    range_key, start_date, end_date, _ = _request_range()
+
+    ledger = ledger_query(start_date, end_date, detail=True)
+    query = (
+        select(
+            ledger.c.date,
+            ledger.c.source,
+            ledger.c.reference,
+            ledger.c.party,
+            ledger.c.account_name,
+            ledger.c.account_type,
+            ledger.c.description,
+            ledger.c.currency_code,
+            ledger.c.amount,
+            ledger.c.amount_cad
+        )
+        .order_by(ledger.c.date, ledger.c.source, ledger.c.line_id)
+    )
+
+    def rows():
+        yield from db.session.execute(query.execution_options(yield_per=CSV_CHUNK_SIZE))
+
+    return _stream_csv(
+        f'ledger_{start_date or "all"}_{end_date or "all"}.csv',
+        ['date', 'source', 'reference', 'party', 'account', 'account_type',
+         'description', 'currency', 'amount', 'amount_cad'],
+        rows()
+    )
+
+@bp.route('/account-balances')
+def account_balances():
+    """
+    Closing CAD balance of every account as of a date, grouped by account
+    type. The chart of accounts has no asset, liability or equity accounts,
+    so this is the cumulative P&L per account rather than a balance sheet.
+    """
+    as_of_str = request.args.get('as_of')
+    as_of = datetime.fromisoformat(as_of_str).date() if as_of_str else date.today()
+
+    # 1) latest monthly snapshot plus the daily totals booked since
+    balances = balances_as_of(as_of)
+
+    # 2) group by account type
+    accounts = Account.query.filter(Account.id.in_(list(balances))).order_by(Account.name).all()
+    sections = []
+    for acc_type in BALANCE_TYPES:
+        rows = [
+            {'id': acct.id, 'name': acct.name, 'balance': balances[acct.id]}
+            for acct in accounts if acct.type == acc_type and balances[acct.id]
+        ]
+        if rows:
+            sections.append({
+                'type': acc_type,
+                'accounts': rows,
+                'total': sum(row['balance'] for row in rows)
+            })
+
+    # 3) net profit accumulated by the P&L accounts up to the date
+    totals = {section['type']: section['total'] for section in sections}
+    net_profit = (
+        totals.get('Income', Decimal('0'))
+        - totals.get('COGS', Decimal('0'))
+        - totals.get('Expense', Decimal('0'))
+        - totals.get('Fees', Decimal('0'))
+    )
+
+    return render_template(
+        'reports/account_balances.html',
+        as_of=as_of,
+        sections=sections,
+        net_profit=net_profit
     )
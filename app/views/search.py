@@ -0,0 +1,31 @@
+from flask import Blueprint, render_template, request, url_for
+
+from ..models import db, Order
+from ..utils.search import search as search_index
+
+bp = Blueprint('search', __name__, template_folder='templates/search')
+
+KIND_LABELS = {'order': 'Order', 'customer': 'Customer', 'expense': 'Expense'}
+
+
+@bp.route('/')
+def search():
+    """Full-text search over orders, customers and expense invoices."""
+    query = request.args.get('q', '').strip()
+    results = search_index(query) if query else []
+
+    # order pages are addressed by number; fetch them for the hits in one query
+    order_ids = [r['ref_id'] for r in results if r['kind'] == 'order']
+    numbers = dict(
+        db.session.query(Order.id, Order.order_number).filter(Order.id.in_(order_ids))
+    ) if order_ids else {}
+    for r in results:
+        r['label'] = KIND_LABELS[r['kind']]
+        if r['kind'] == 'order' and r['ref_id'] in numbers:
+            r['url'] = url_for('orders.show_order', order_number=numbers[r['ref_id']])
+        elif r['kind'] == 'expense':
+            r['url'] = url_for('expenses.show_expense', invoice_id=r['ref_id'])
+        else:
+            r['url'] = None
+
+    return render_template('search/results.html', query=query, results=results)
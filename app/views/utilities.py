@@ -2,11 +2,17 @@ import os
 import requests
 from datetime import datetime
 from decimal import Decimal
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
-from sqlalchemy import cast, String
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
+from sqlalchemy import or_, select
 
-from ..models import db, Order, ExpenseInvoice, ExpenseItem, Provider, Account
-from ..utils.currency import usd_to_cad
+from ..models import db, Order, ExpenseInvoice, ExpenseItem, Provider, Account, ClosedPeriod
+from ..utils.cad_amounts import cad_fields, apply_cad
+from ..utils.currency import usd_to_cad, rate_cache_stats
+from ..utils.daily_totals import refresh_daily_totals
+from ..utils.data_version import bump_data_version, current_data_version
+from ..utils.periods import closed_months, is_closed, close_period, reopen_period
+from ..utils.search import index_expense_invoices
+from ..utils.report_cache import report_cache
 
 bp = Blueprint('utilities', __name__, template_folder='templates/utilities')
 
@@ -14,7 +20,47 @@ bp = Blueprint('utilities', __name__, template_folder='templates/utilities')
 @bp.route('/')
 def index():
     """Utilities dashboard with various utility options"""
-    return render_template('utilities/index.html')
+    closed_periods = ClosedPeriod.query.order_by(ClosedPeriod.period_start.desc()).all()
+    return render_template('utilities/index.html', closed_periods=closed_periods)
+
+
+def _parse_month(value):
+    """'YYYY-MM' -> first day of that month. Raises ValueError."""
+    return datetime.strptime(value or '', '%Y-%m').date()
+
+
+@bp.route('/periods/close', methods=['POST'])
+def close_period_view():
+    """Freeze the daily totals of a finished month and refuse later writes into it."""
+    try:
+        count = close_period(_parse_month(request.form.get('month')))
+    except ValueError as e:
+        flash(str(e), 'warning')
+    else:
+        flash(f"Period closed; {count} daily total rows frozen.", 'success')
+    return redirect(url_for('utilities.index'))
+
+
+@bp.route('/periods/<month>/reopen', methods=['POST'])
+def reopen_period_view(month):
+    """Move a closed month's frozen totals back to the live table."""
+    try:
+        count = reopen_period(_parse_month(month))
+    except ValueError as e:
+        flash(str(e), 'warning')
+    else:
+        flash(f"Period {month} reopened; {count} daily total rows restored.", 'success')
+    return redirect(url_for('utilities.index'))
+
+
+@bp.route('/cache-stats')
+def cache_stats():
+    """Hit/miss counters of the exchange-rate and report caches, as JSON."""
+    return jsonify({
+        'data_version': current_data_version(),
+        'rate_cache': rate_cache_stats(),
+        'report_cache': report_cache().stats(),
+    })
 
 
 @bp.route('/printify-import', methods=['GET', 'POST'])
@@ -66,38 +112,16 @@ def find_orders_without_cogs():
     """Find orders that don't have complete COGS expense items (production cost or tax)"""
     # Check for orders that have BOTH production COGS AND tax
     # We want to re-import orders missing either one
-    
-    # Get all order numbers that have COGS production cost
-    orders_with_prod_cogs = (
-        db.session.query(cast(ExpenseItem.order_id, String))
-        .join(Account, ExpenseItem.account_id == Account.id)
-        .filter(Account.name == 'COGS')
-        .distinct()
-        .all()
-    )
-    orders_with_prod_cogs_set = {row[0] for row in orders_with_prod_cogs}
-    
-    # Get all order numbers that have COGS tax
-    orders_with_tax = (
-        db.session.query(cast(ExpenseItem.order_id, String))
-        .join(Account, ExpenseItem.account_id == Account.id)
-        .filter(Account.name == 'COGS Tax')
-        .distinct()
-        .all()
-    )
-    orders_with_tax_set = {row[0] for row in orders_with_tax}
-    
-    # Get all orders
-    all_orders = Order.query.all()
-    
-    # Filter to those without BOTH production cost AND tax
-    orders_without_complete_cogs = [
-        order for order in all_orders 
-        if order.order_number not in orders_with_prod_cogs_set 
-        or order.order_number not in orders_with_tax_set
-    ]
-    
-    return orders_without_complete_cogs
+    def has_item_in(account_name):
+        # an index seek on expense_items.order_id per order
+        return (
+            select(ExpenseItem.id)
+            .join(Account, ExpenseItem.account_id == Account.id)
+            .where(ExpenseItem.order_id == Order.id, Account.name == account_name)
+            .exists()
+        )
+
+    return Order.query.filter(or_(~has_item_in('COGS'), ~has_item_in('COGS Tax'))).all()
 
 
 def import_from_printify_api(api_token, shop_id, orders):
@@ -124,6 +148,9 @@ def import_from_printify_api(api_token, shop_id, orders):
         raise Exception("Printify provider not found. Please create a provider named 'Printify'.")
     
     results = {'success': 0, 'skipped': 0, 'failed': 0}
+    touched_days = set()
+    touched_invoices = set()
+    closed = closed_months()
     
     # Fetch all Printify orders first (with pagination)
     printify_orders_map = {}
@@ -195,6 +222,11 @@ def import_from_printify_api(api_token, shop_id, orders):
                 current_app.logger.warning(f"No Printify order found for {order.order_number}")
                 results['skipped'] += 1
                 continue
+
+            if is_closed(order.order_date, closed):
+                current_app.logger.warning(f"Order {order.order_number} is in a closed period; COGS not imported")
+                results['skipped'] += 1
+                continue
             
             # Extract cost data from line items
             product_cost = Decimal('0')
@@ -230,6 +262,7 @@ def import_from_printify_api(api_token, shop_id, orders):
                 exp_inv = existing_inv
                 exp_inv.total_amount = total_cost
                 exp_inv.supplier_invoice = matching_order.get('id')
+                apply_cad(exp_inv, total_cost, printify_provider.currency_code, exp_inv.invoice_date)
                 current_app.logger.info(f"Updating existing invoice for order {order.order_number}")
             else:
                 # Create new expense invoice
@@ -238,12 +271,13 @@ def import_from_printify_api(api_token, shop_id, orders):
                     invoice_date=order.order_date,
                     invoice_number=order.order_number,
                     supplier_invoice=matching_order.get('id'),
-                    total_amount=total_cost
+                    total_amount=total_cost,
+                    **cad_fields(total_cost, printify_provider.currency_code, order.order_date)
                 )
                 db.session.add(exp_inv)
                 db.session.flush()
             
-            # Add expense items (linking to order by order_number as string)
+            # Add expense items, linked to the order by order_id
             # Only add production cost if it doesn't already exist
             if product_cost > 0:
                 existing_prod_item = ExpenseItem.query.filter_by(
@@ -258,7 +292,8 @@ def import_from_printify_api(api_token, shop_id, orders):
                         description='Production Cost (Printify API)',
                         amount=product_cost,
                         currency_code='USD',
-                        order_id=order.order_number
+                        order_id=order.id,
+                        **cad_fields(product_cost, 'USD', exp_inv.invoice_date)
                     ))
                     current_app.logger.info(f"Added production cost ${product_cost} for order {order.order_number}")
             
@@ -276,7 +311,8 @@ def import_from_printify_api(api_token, shop_id, orders):
                         description='Shipping Cost (Printify API)',
                         amount=shipping_cost,
                         currency_code='USD',
-                        order_id=order.order_number
+                        order_id=order.id,
+                        **cad_fields(shipping_cost, 'USD', exp_inv.invoice_date)
                     ))
             
             # Only add sales tax if it doesn't already exist (one per order)
@@ -293,11 +329,14 @@ def import_from_printify_api(api_token, shop_id, orders):
                         description='Sales Tax Charged (Printify API)',
                         amount=tax_cost,
                         currency_code='USD',
-                        order_id=order.order_number
+                        order_id=order.id,
+                        **cad_fields(tax_cost, 'USD', exp_inv.invoice_date)
                     ))
             
             current_app.logger.info(f"Imported COGS for order {order.order_number}: Product ${product_cost}, Shipping ${shipping_cost}, Tax ${tax_cost}")
             results['success'] += 1
+            touched_days.add(exp_inv.invoice_date)
+            touched_invoices.add(exp_inv.id)
             
         except Exception as e:
             current_app.logger.error(f"Error processing order {order.order_number}: {e}")
@@ -305,6 +344,9 @@ def import_from_printify_api(api_token, shop_id, orders):
             continue
     
     # Commit all changes
+    refresh_daily_totals(touched_days)
+    index_expense_invoices(touched_invoices)
+    bump_data_version()
     db.session.commit()
     
     return results
@@ -27,3 +27,17 @@ class Config:
     # Printify API credentials
     PRINTIFY_API_TOKEN = os.getenv("PRINTIFY_API_TOKEN")
     PRINTIFY_SHOP_ID = os.getenv("PRINTIFY_SHOP_ID")
+
+    # Orders shown per page on the orders list (?per_page= overrides it)
+    ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", "50"))
+
+    # Seconds an uploaded import waits for confirmation before it is purged
+    IMPORT_SESSION_TTL = int(os.getenv("IMPORT_SESSION_TTL", "86400"))
+
+    # P&L report cache: "memory" (per worker) or "sqlite" (shared file)
+    REPORT_CACHE_BACKEND = os.getenv("REPORT_CACHE_BACKEND", "memory")
+    REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+    REPORT_CACHE_PATH = os.getenv(
+        "REPORT_CACHE_PATH",
+        os.path.join(basedir, "../data/report_cache.sqlite")
+    )
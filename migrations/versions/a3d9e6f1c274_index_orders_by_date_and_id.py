@@ -0,0 +1,29 @@
+"""Index orders by date and id
+
+Revision ID: a3d9e6f1c274
+Revises: f5c1a8d3e2b7
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d9e6f1c274'
+down_revision = 'f5c1a8d3e2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the composite index covers everything the single-column one did
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_orders_order_date'))
+        batch_op.create_index('ix_orders_order_date_id', ['order_date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_order_date_id')
+        batch_op.create_index(batch_op.f('ix_orders_order_date'), ['order_date'], unique=False)
@@ -0,0 +1,32 @@
+"""Index order and invoice dates
+
+Revision ID: b19f3e7a6d52
+Revises: a7d25e9c4b80
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b19f3e7a6d52'
+down_revision = 'a7d25e9c4b80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_orders_order_date'), ['order_date'], unique=False)
+
+    with op.batch_alter_table('expense_invoices', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_expense_invoices_invoice_date'), ['invoice_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('expense_invoices', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_expense_invoices_invoice_date'))
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_orders_order_date'))
@@ -0,0 +1,50 @@
+"""Link expense items to orders by id
+
+Revision ID: b7e2c4f9a815
+Revises: a3d9e6f1c274
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c4f9a815'
+down_revision = 'a3d9e6f1c274'
+branch_labels = None
+depends_on = None
+
+
+# expense_items.order_id held the order *number*; point it at orders.id and
+# clear it where no order carries that number (e.g. ad invoice numbers)
+TO_ORDER_IDS = """
+UPDATE expense_items
+SET order_id = (
+    SELECT o.id FROM orders o
+    WHERE o.order_number = CAST(expense_items.order_id AS TEXT)
+)
+WHERE order_id IS NOT NULL
+"""
+
+TO_ORDER_NUMBERS = """
+UPDATE expense_items
+SET order_id = (
+    SELECT CAST(o.order_number AS INTEGER) FROM orders o
+    WHERE o.id = expense_items.order_id
+)
+WHERE order_id IS NOT NULL
+"""
+
+
+def upgrade():
+    op.execute(TO_ORDER_IDS)
+    with op.batch_alter_table('expense_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_expense_items_order_id'), ['order_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('expense_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_expense_items_order_id'))
+
+    op.execute(TO_ORDER_NUMBERS)
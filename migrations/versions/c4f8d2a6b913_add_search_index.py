@@ -0,0 +1,79 @@
+"""Add search index
+
+Revision ID: c4f8d2a6b913
+Revises: b7e2c4f9a815
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f8d2a6b913'
+down_revision = 'b7e2c4f9a815'
+branch_labels = None
+depends_on = None
+
+
+# kept in step with app/utils/search.py
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE search_index USING fts5("
+    " kind UNINDEXED, ref_id UNINDEXED, title UNINDEXED, detail UNINDEXED, body,"
+    " tokenize = 'unicode61', prefix = '2 3')",
+]
+POSTGRESQL_DDL = [
+    "CREATE TABLE search_index ("
+    " rowid BIGINT PRIMARY KEY, kind VARCHAR(16) NOT NULL, ref_id INTEGER NOT NULL,"
+    " title TEXT, detail TEXT, body TEXT,"
+    " tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(body, ''))) STORED)",
+    "CREATE INDEX ix_search_index_tsv ON search_index USING gin (tsv)",
+]
+
+
+# The documents _order_docs, _customer_docs and _expense_docs build, with
+# rowid = id * 4 + kind code (order 1, customer 2, expense 3). {agg} is the
+# dialect's string aggregate: group_concat on SQLite, string_agg on PostgreSQL.
+BACKFILL = [
+    """
+INSERT INTO search_index (rowid, kind, ref_id, title, detail, body)
+SELECT o.id * 4 + 1, 'order', o.id, 'Order #' || o.order_number,
+       CASE WHEN COALESCE(c.name, '') = '' THEN CAST(o.order_date AS VARCHAR)
+            ELSE CAST(o.order_date AS VARCHAR) || ' · ' || c.name END,
+       o.order_number || ' ' || COALESCE(c.name, '') || ' ' || COALESCE(c.email, '') || ' ' || COALESCE(
+           (SELECT {agg}(oi.product_sku || ' ' || COALESCE(oi.variant, '') || ' ' || COALESCE(p.name, ''), ' ')
+              FROM order_items oi LEFT JOIN products p ON p.id = oi.product_id
+             WHERE oi.order_id = o.id AND oi.product_sku NOT IN ('SHIPPING', 'DISCOUNT')), '')
+FROM orders o
+LEFT JOIN customers c ON c.id = o.customer_id
+""",
+    """
+INSERT INTO search_index (rowid, kind, ref_id, title, detail, body)
+SELECT c.id * 4 + 2, 'customer', c.id, c.name, COALESCE(c.email, ''),
+       c.name || ' ' || COALESCE(c.email, '')
+FROM customers c
+""",
+    """
+INSERT INTO search_index (rowid, kind, ref_id, title, detail, body)
+SELECT ei.id * 4 + 3, 'expense', ei.id,
+       TRIM(pr.name || ' ' || COALESCE(NULLIF(ei.supplier_invoice, ''), NULLIF(ei.invoice_number, ''), '')),
+       CAST(ei.invoice_date AS VARCHAR),
+       COALESCE(ei.supplier_invoice, '') || ' ' || COALESCE(ei.invoice_number, '') || ' ' || pr.name || ' ' ||
+       COALESCE((SELECT {agg}(COALESCE(it.description, ''), ' ')
+                   FROM expense_items it WHERE it.expense_invoice_id = ei.id), '')
+FROM expense_invoices ei
+JOIN providers pr ON pr.id = ei.provider_id
+""",
+]
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    for statement in POSTGRESQL_DDL if postgresql else SQLITE_DDL:
+        op.execute(statement)
+    for statement in BACKFILL:
+        op.execute(statement.format(agg='string_agg' if postgresql else 'group_concat'))
+
+
+def downgrade():
+    op.execute("DROP TABLE search_index")
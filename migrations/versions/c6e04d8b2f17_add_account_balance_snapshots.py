@@ -0,0 +1,37 @@
+"""Add account balance snapshots
+
+Revision ID: c6e04d8b2f17
+Revises: b19f3e7a6d52
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e04d8b2f17'
+down_revision = 'b19f3e7a6d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('account_balance_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('period_end', sa.Date(), nullable=False),
+    sa.Column('balance_cad', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id', 'period_end', name='uq_account_balance_snapshots_account_period')
+    )
+    with op.batch_alter_table('account_balance_snapshots', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_account_balance_snapshots_period_end'), ['period_end'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('account_balance_snapshots', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_account_balance_snapshots_period_end'))
+
+    op.drop_table('account_balance_snapshots')
@@ -0,0 +1,35 @@
+"""Add materialized CAD amounts
+
+Revision ID: d4e7b91a2c05
+Revises: c8f2a1d0f3c4
+Create Date: 2026-10-17 00:00:00.000000
+
+Existing rows are left NULL; run `flask recompute-cad` to backfill them.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e7b91a2c05'
+down_revision = 'c8f2a1d0f3c4'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('orders', 'order_items', 'expense_invoices', 'expense_items')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('amount_cad', sa.Numeric(precision=12, scale=2), nullable=True))
+            batch_op.add_column(sa.Column('rate_used', sa.Numeric(precision=18, scale=8), nullable=True))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('rate_used')
+            batch_op.drop_column('amount_cad')
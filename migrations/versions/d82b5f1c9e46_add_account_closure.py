@@ -0,0 +1,50 @@
+"""Add account closure table
+
+Revision ID: d82b5f1c9e46
+Revises: c6e04d8b2f17
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd82b5f1c9e46'
+down_revision = 'c6e04d8b2f17'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL = """
+WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+    SELECT id, id, 0 FROM accounts
+    UNION ALL
+    SELECT tree.ancestor_id, accounts.id, tree.depth + 1
+    FROM tree JOIN accounts ON accounts.parent_id = tree.descendant_id
+)
+INSERT INTO account_closure (ancestor_id, descendant_id, depth)
+SELECT ancestor_id, descendant_id, depth FROM tree
+"""
+
+
+def upgrade():
+    op.create_table('account_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['accounts.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['accounts.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    with op.batch_alter_table('account_closure', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_account_closure_descendant_id'), ['descendant_id'], unique=False)
+
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    with op.batch_alter_table('account_closure', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_account_closure_descendant_id'))
+
+    op.drop_table('account_closure')
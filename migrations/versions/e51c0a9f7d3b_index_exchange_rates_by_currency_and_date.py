@@ -0,0 +1,24 @@
+"""Index exchange rates by currency and date
+
+Revision ID: e51c0a9f7d3b
+Revises: d4e7b91a2c05
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e51c0a9f7d3b'
+down_revision = 'd4e7b91a2c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_exchange_rates_currency_code_date', 'exchange_rates', ['currency_code', 'date'])
+
+
+def downgrade():
+    op.drop_index('ix_exchange_rates_currency_code_date', table_name='exchange_rates')
@@ -0,0 +1,52 @@
+"""Add closed periods and frozen account totals
+
+Revision ID: e93a7c5d1b28
+Revises: d82b5f1c9e46
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e93a7c5d1b28'
+down_revision = 'd82b5f1c9e46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('closed_periods',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('closed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('period_start', name=op.f('uq_closed_periods_period_start'))
+    )
+    op.create_table('frozen_account_totals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('currency_code', sa.String(length=3), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('amount_cad', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.ForeignKeyConstraint(['currency_code'], ['currencies.code'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id', 'day', 'currency_code', name='uq_frozen_account_totals_account_day_currency')
+    )
+    with op.batch_alter_table('frozen_account_totals', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_frozen_account_totals_day'), ['day'], unique=False)
+        batch_op.create_index(batch_op.f('ix_frozen_account_totals_period_start'), ['period_start'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('frozen_account_totals', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_frozen_account_totals_period_start'))
+        batch_op.drop_index(batch_op.f('ix_frozen_account_totals_day'))
+
+    op.drop_table('frozen_account_totals')
+    op.drop_table('closed_periods')
@@ -0,0 +1,75 @@
+"""Add daily account totals
+
+Revision ID: f3a8c6e2d194
+Revises: e51c0a9f7d3b
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c6e2d194'
+down_revision = 'e51c0a9f7d3b'
+branch_labels = None
+depends_on = None
+
+
+# Rows without a materialized CAD amount are converted with the nearest prior
+# stored rate (or the nearest later one); `flask rebuild-daily-totals`
+# recomputes the table with the application's full rate lookup.
+RATE = """
+    CASE WHEN {cur} = 'CAD' THEN 1 ELSE COALESCE(
+        (SELECT er.rate FROM exchange_rates er
+          WHERE er.currency_code = {cur} AND er.date <= {day}
+          ORDER BY er.date DESC LIMIT 1),
+        (SELECT er.rate FROM exchange_rates er
+          WHERE er.currency_code = {cur} AND er.date > {day}
+          ORDER BY er.date ASC LIMIT 1),
+        1) END
+"""
+
+BACKFILL = f"""
+INSERT INTO daily_account_totals (account_id, day, currency_code, amount, amount_cad, count)
+SELECT account_id, day, currency_code, ROUND(SUM(amount), 2), ROUND(SUM(amount_cad), 2), COUNT(*)
+FROM (
+    SELECT oi.account_id AS account_id, o.order_date AS day, oi.currency_code AS currency_code,
+           oi.subtotal AS amount,
+           COALESCE(oi.amount_cad, ROUND(oi.subtotal * {RATE.format(cur='oi.currency_code', day='o.order_date')}, 2)) AS amount_cad
+    FROM order_items oi JOIN orders o ON oi.order_id = o.id
+    UNION ALL
+    SELECT ei.account_id, inv.invoice_date, ei.currency_code,
+           ei.amount,
+           COALESCE(ei.amount_cad, ROUND(ei.amount * {RATE.format(cur='ei.currency_code', day='inv.invoice_date')}, 2))
+    FROM expense_items ei JOIN expense_invoices inv ON ei.expense_invoice_id = inv.id
+) ledger
+GROUP BY account_id, day, currency_code
+"""
+
+
+def upgrade():
+    op.create_table('daily_account_totals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('currency_code', sa.String(length=3), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('amount_cad', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+    sa.ForeignKeyConstraint(['currency_code'], ['currencies.code'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id', 'day', 'currency_code', name='uq_daily_account_totals_account_day_currency')
+    )
+    with op.batch_alter_table('daily_account_totals', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_daily_account_totals_day'), ['day'], unique=False)
+
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    with op.batch_alter_table('daily_account_totals', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_daily_account_totals_day'))
+
+    op.drop_table('daily_account_totals')
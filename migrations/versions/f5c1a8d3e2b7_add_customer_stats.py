@@ -0,0 +1,68 @@
+"""Add customer stats
+
+Revision ID: f5c1a8d3e2b7
+Revises: e93a7c5d1b28
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c1a8d3e2b7'
+down_revision = 'e93a7c5d1b28'
+branch_labels = None
+depends_on = None
+
+
+# Orders without a materialized CAD amount are converted with the nearest
+# prior stored rate (or the nearest later one), like the daily totals backfill.
+CURRENCY = """
+    COALESCE((SELECT MAX(oi.currency_code) FROM order_items oi WHERE oi.order_id = o.id), 'USD')
+"""
+RATE = """
+    CASE WHEN {cur} = 'CAD' THEN 1 ELSE COALESCE(
+        (SELECT er.rate FROM exchange_rates er
+          WHERE er.currency_code = {cur} AND er.date <= {day}
+          ORDER BY er.date DESC LIMIT 1),
+        (SELECT er.rate FROM exchange_rates er
+          WHERE er.currency_code = {cur} AND er.date > {day}
+          ORDER BY er.date ASC LIMIT 1),
+        1) END
+"""
+
+BACKFILL = f"""
+INSERT INTO customer_stats (customer_id, order_count, first_order_date, last_order_date,
+                            amount_spent, amount_spent_cad)
+SELECT o.customer_id, COUNT(o.id), MIN(o.order_date), MAX(o.order_date),
+       COALESCE(SUM(o.total_amount), 0),
+       COALESCE(SUM(COALESCE(o.amount_cad,
+                             ROUND(o.total_amount * {RATE.format(cur=CURRENCY, day='o.order_date')}, 2))), 0)
+FROM orders o
+GROUP BY o.customer_id
+"""
+
+
+def upgrade():
+    op.create_table('customer_stats',
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('first_order_date', sa.Date(), nullable=True),
+    sa.Column('last_order_date', sa.Date(), nullable=True),
+    sa.Column('amount_spent', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('amount_spent_cad', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['customer_id'], ['customers.id'], ),
+    sa.PrimaryKeyConstraint('customer_id')
+    )
+    with op.batch_alter_table('customer_stats', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_customer_stats_first_order_date'), ['first_order_date'], unique=False)
+
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    with op.batch_alter_table('customer_stats', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_customer_stats_first_order_date'))
+
+    op.drop_table('customer_stats')
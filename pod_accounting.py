@@ -15,10 +15,114 @@ app = create_app()
 @app.cli.command("create-db")
 @with_appcontext
 def create_db():
+    from app.utils.search import create_search_index
+
     db.create_all()
+    create_search_index()
+    db.session.commit()
     click.echo("Database tables created.")
 
 
+@app.cli.command("recompute-cad")
+@click.option("--start", type=click.DateTime(formats=["%Y-%m-%d"]), help="First date to refresh (YYYY-MM-DD).")
+@click.option("--end", type=click.DateTime(formats=["%Y-%m-%d"]), help="Last date to refresh (YYYY-MM-DD).")
+@with_appcontext
+def recompute_cad(start, end):
+    """Refresh stored CAD amounts, e.g. after exchange rates changed."""
+    from app.utils.cad_amounts import recompute_cad_amounts
+    from app.utils.customer_stats import rebuild_customer_stats
+    from app.utils.daily_totals import rebuild_daily_totals
+
+    counts = recompute_cad_amounts(start.date() if start else None, end.date() if end else None)
+    for table, count in counts.items():
+        click.echo(f"{table}: {count} rows updated.")
+    click.echo(f"daily_account_totals: {rebuild_daily_totals()} rows rebuilt.")
+    click.echo(f"customer_stats: {rebuild_customer_stats()} rows rebuilt.")
+
+
+@app.cli.command("rebuild-daily-totals")
+@with_appcontext
+def rebuild_daily_totals():
+    """Recompute the daily account totals from every order and expense item."""
+    from app.utils.daily_totals import rebuild_daily_totals as rebuild
+
+    click.echo(f"daily_account_totals: {rebuild()} rows rebuilt.")
+
+
+@app.cli.command("rebuild-customer-stats")
+@with_appcontext
+def rebuild_customer_stats():
+    """Recompute the per-customer order stats from every order."""
+    from app.utils.customer_stats import rebuild_customer_stats as rebuild
+
+    click.echo(f"customer_stats: {rebuild()} rows rebuilt.")
+
+
+@app.cli.command("build-snapshots")
+@click.option("--rebuild", is_flag=True, help="Drop every snapshot and build them all again.")
+@with_appcontext
+def build_snapshots(rebuild):
+    """Extend the monthly account balance snapshots through the last closed month."""
+    from app.models import AccountBalanceSnapshot
+    from app.utils.balances import build_snapshots as build
+
+    if rebuild:
+        AccountBalanceSnapshot.query.delete(synchronize_session=False)
+    count = build()
+    db.session.commit()
+    click.echo(f"account_balance_snapshots: {count} rows written.")
+
+
+@app.cli.command("rebuild-account-tree")
+@with_appcontext
+def rebuild_account_tree():
+    """Recompute the account closure table from accounts.parent_id."""
+    from app.utils.account_tree import rebuild_account_closure
+    from app.utils.data_version import bump_data_version
+
+    count = rebuild_account_closure()
+    bump_data_version()
+    db.session.commit()
+    click.echo(f"account_closure: {count} rows written.")
+
+
+@app.cli.command("rebuild-search-index")
+@with_appcontext
+def rebuild_search_index():
+    """Index every order, customer and expense invoice for /search from scratch."""
+    from app.utils.search import rebuild_search_index as rebuild
+
+    click.echo(f"search_index: {rebuild()} documents indexed.")
+
+
+@app.cli.command("close-period")
+@click.argument("month", type=click.DateTime(formats=["%Y-%m"]))
+@with_appcontext
+def close_period_command(month):
+    """Close MONTH (YYYY-MM): freeze its daily totals and refuse writes into it."""
+    from app.utils.periods import close_period
+
+    try:
+        count = close_period(month.date())
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{month:%Y-%m} closed: {count} daily total rows frozen.")
+
+
+@app.cli.command("reopen-period")
+@click.argument("month", type=click.DateTime(formats=["%Y-%m"]))
+@with_appcontext
+def reopen_period_command(month):
+    """Reopen a closed MONTH (YYYY-MM) and move its totals back to the live table."""
+    from app.utils.periods import reopen_period
+
+    try:
+        count = reopen_period(month.date())
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{month:%Y-%m} reopened: {count} daily total rows restored.")
+
+
 if __name__ == "__main__":
     host = os.getenv("FLASK_RUN_HOST", "0.0.0.0")
     port = int(os.getenv("FLASK_RUN_PORT", "5050"))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Time the Shopify order import against a throwaway SQLite database.
+
+    python scripts/bench_import.py --orders 20000
+
+Generates a Shopify-style orders export with the given number of orders
+(1-3 line items each, about a third of them paid through Shopify Payments),
+seeds the accounts, the Shopify provider and a year of USD rates, and runs
+orders.perform_import on it. Nothing touches the configured database.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.pop('OPEN_EXCHANGE_API', None)
+os.environ.pop('EXCHANGERATE_HOST_KEY', None)
+
+from app import create_app  # noqa: E402
+from app.models import db, Account, Currency, ExchangeRate, Order, OrderItem, Provider  # noqa: E402
+
+COLUMNS = [
+    'Name', 'Email', 'Financial Status', 'Currency', 'Payment Method', 'Fulfillment Status',
+    'Created at', 'Subtotal', 'Shipping', 'Taxes', 'Total', 'Discount Amount', 'Billing Name',
+    'Billing Phone', 'Billing Address1', 'Billing City', 'Billing Province', 'Billing Zip',
+    'Billing Country', 'Lineitem name', 'Lineitem price', 'Lineitem quantity', 'Lineitem sku',
+]
+ACCOUNTS = [
+    ('Sales', 'Income'), ('Shipping Charged', 'Income'), ('Discounts Given', 'Income'),
+    ('Merchant Fees', 'Fees'), ('Currency Conversion Fees', 'Fees'),
+]
+YEAR = 2024
+
+
+def write_orders_csv(path, count, seed=1):
+    rnd = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for idx in range(count):
+            day = date(YEAR, 1, 1) + timedelta(days=rnd.randint(0, 364))
+            customer = rnd.randint(0, max(count // 3, 1))
+            items = [
+                (f"Shirt {rnd.randint(1, 200)} - {rnd.choice(['S', 'M', 'L'])}",
+                 Decimal(rnd.randint(1500, 4000)) / 100, rnd.randint(1, 3))
+                for _ in range(rnd.randint(1, 3))
+            ]
+            sub_total = sum(price * qty for _, price, qty in items)
+            shipping = Decimal('5.00')
+            discount = Decimal(rnd.choice([0, 0, 2]))
+            for pos, (name, price, qty) in enumerate(items):
+                row = {
+                    'Name': f'#{10000 + idx}',
+                    'Lineitem name': name,
+                    'Lineitem price': str(price),
+                    'Lineitem quantity': qty,
+                    'Lineitem sku': 'SKU-' + name.replace(' ', ''),
+                }
+                if pos == 0:
+                    row.update({
+                        'Email': f'customer{customer}@example.com',
+                        'Financial Status': 'paid',
+                        'Currency': 'USD',
+                        'Payment Method': rnd.choice(['Shopify Payments', 'PayPal', 'PayPal']),
+                        'Fulfillment Status': 'fulfilled',
+                        'Created at': f'{day} 10:00:00 -0500',
+                        'Subtotal': str(sub_total),
+                        'Shipping': str(shipping),
+                        'Taxes': '0',
+                        'Total': str(sub_total + shipping - discount),
+                        'Discount Amount': str(discount),
+                        'Billing Name': f'Customer {customer}',
+                        'Billing City': 'Montreal',
+                    })
+                writer.writerow(row)
+
+
+def seed():
+    db.create_all()
+    db.session.add_all([Currency(code='CAD', name='Canadian Dollar'), Currency(code='USD', name='US Dollar')])
+    db.session.add_all([Account(name=name, type=kind) for name, kind in ACCOUNTS])
+    db.session.add(Provider(name='Shopify', type='service', currency_code='CAD'))
+    rnd = random.Random(2)
+    day = date(YEAR, 1, 1)
+    while day.year == YEAR:
+        db.session.add(ExchangeRate(currency_code='USD', date=day,
+                                    rate=Decimal('1.3') + Decimal(rnd.randint(0, 999)) / 10000))
+        day += timedelta(days=1)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=20000, help='orders in the generated export')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_import_')
+
+    class BenchConfig:
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = 'bench'
+        REPORT_CACHE_BACKEND = 'memory'
+
+    app = create_app(BenchConfig)
+    csv_path = os.path.join(workdir, 'orders.csv')
+    write_orders_csv(csv_path, args.orders)
+
+    with app.app_context():
+        from app.utils.search import create_search_index
+        from app.views.orders import perform_import
+
+        seed()
+        create_search_index()
+        db.session.commit()
+
+        started = time.perf_counter()
+        created = perform_import(csv_path)
+        elapsed = time.perf_counter() - started
+
+        items = db.session.query(OrderItem).count()
+        assert created == db.session.query(Order).count() == args.orders
+    print(f"{created} orders ({items} order items) imported in {elapsed:.2f}s "
+          f"({created / elapsed:.0f} orders/s)")
+
+
+if __name__ == '__main__':
+    main()
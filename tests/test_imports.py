@@ -0,0 +1,114 @@
+import csv
+import pickle
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from app.models import (
+    db, Account, ClosedPeriod, Currency, Customer, DailyAccountTotal, ExchangeRate, Order, OrderItem, Provider
+)
+from app.utils import currency, import_sessions
+from app.utils.periods import PeriodClosedError
+from app.utils.search import create_search_index
+from app.views import orders
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = 'test'
+        TESTING = True
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        create_search_index()
+        db.session.add_all([Currency(code='CAD', name='Canadian Dollar'), Currency(code='USD', name='US Dollar')])
+        db.session.add_all([
+            Account(name='Sales', type='Income'),
+            Account(name='Merchant Fees', type='Fees'),
+            Account(name='Currency Conversion Fees', type='Fees'),
+        ])
+        db.session.add(Provider(name='Shopify', type='service', currency_code='CAD'))
+        db.session.add_all([
+            ExchangeRate(currency_code='USD', date=date(2025, month, 1), rate=Decimal('1.35'))
+            for month in range(1, 13)
+        ])
+        db.session.commit()
+        currency.clear_rate_cache()
+        yield app
+        currency.clear_rate_cache()
+
+
+@pytest.fixture
+def fetched_rates(monkeypatch):
+    """Serve rates the import has to fetch (and store) from a fake provider."""
+    monkeypatch.setattr(currency, 'API_KEY', 'test')
+    monkeypatch.setattr(currency, '_fetch_usd_time_series', lambda days: {day: Decimal('1.36') for day in days})
+
+
+def _write_orders(path, days):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Name', 'Email', 'Financial Status', 'Currency', 'Payment Method', 'Created at',
+                         'Subtotal', 'Total', 'Lineitem name', 'Lineitem price', 'Lineitem quantity'])
+        for idx, day in enumerate(days):
+            writer.writerow([f'#{1000 + idx}', f'customer{idx}@example.com', 'paid', 'USD', 'Shopify Payments',
+                             f'{day} 10:00:00 -0500', '20.00', '20.00', 'Shirt - M', '20.00', '1'])
+
+
+def test_closed_month_in_a_later_chunk_writes_nothing(app, fetched_rates, tmp_path, monkeypatch):
+    monkeypatch.setattr(orders, 'IMPORT_CHUNK_SIZE', 5)
+    path = tmp_path / 'orders.csv'
+    _write_orders(path, [date(2025, 1 + idx // 2, 1 + idx) for idx in range(20)] + [date(2025, 12, 5)])
+    db.session.add(ClosedPeriod(period_start=date(2025, 12, 1)))
+    db.session.commit()
+
+    with pytest.raises(PeriodClosedError):
+        orders.perform_import(str(path))
+
+    db.session.rollback()
+    assert Order.query.count() == 0
+    assert OrderItem.query.count() == 0
+    assert Customer.query.count() == 0
+    assert DailyAccountTotal.query.count() == 0
+
+
+def test_import_commits_every_chunk_together(app, fetched_rates, tmp_path, monkeypatch):
+    monkeypatch.setattr(orders, 'IMPORT_CHUNK_SIZE', 5)
+    path = tmp_path / 'orders.csv'
+    _write_orders(path, [date(2025, 1 + idx // 2, 1 + idx) for idx in range(21)])
+
+    assert orders.perform_import(str(path)) == 21
+
+    db.session.rollback()
+    assert Order.query.count() == 21
+    assert DailyAccountTotal.query.count() > 0
+    assert ExchangeRate.query.filter_by(rate=Decimal('1.36')).count() > 0
+
+
+def test_staged_records_round_trip_as_json(app):
+    file_key = '0' * 32
+    records = [{'order_date': date(2025, 3, 1), 'order_total': Decimal('20.50'), 'customer': {'name': 'A'},
+                'items': [{'unit_price': Decimal('-0.10'), 'quantity': 2, 'variant': None}]}]
+    import_sessions.stage(file_key, 'orders', records, meta={'provider_id': 3})
+
+    meta, staged = import_sessions.load_stage(file_key, 'orders')
+    assert meta == {'provider_id': 3}
+    assert list(staged) == records
+    assert import_sessions.load_stage(file_key, 'expenses') is None
+    import_sessions.discard(file_key)
+
+
+def test_staged_file_that_is_not_json_is_refused(app):
+    file_key = 'f' * 32
+    path = import_sessions._staged_path(file_key)
+    with open(path, 'wb') as f:
+        pickle.dump({'kind': 'orders', 'meta': {}}, f)
+
+    assert import_sessions.load_stage(file_key, 'orders') is None
+    import_sessions.discard(file_key)
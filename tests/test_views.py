@@ -0,0 +1,82 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from app.models import db, Account, Currency, DailyAccountTotal
+
+
+@pytest.fixture
+def client(tmp_path):
+    class TestConfig:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = 'test'
+        TESTING = True
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Account(name='Sales', type='Income'))
+        db.session.commit()
+        yield app.test_client()
+
+
+@pytest.mark.parametrize('query', [
+    'range=all_time',
+    'range=custom&start=2025-01-01',
+    'range=custom&start=2025-01-01&end=2025-13-01',
+    'range=this_year&granularity=quarter',
+])
+def test_pl_api_rejects_unbounded_or_invalid_ranges(client, query):
+    response = client.get(f'/reports/api/pl?{query}')
+
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+def test_pl_api_answers_a_bounded_range(client):
+    response = client.get('/reports/api/pl?range=custom&start=2025-01-01&end=2025-03-31')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['start_date'], body['end_date']) == ('2025-01-01', '2025-03-31')
+    assert response.headers['ETag']
+
+
+def _expense_tree():
+    """Operating > Software > Hosting, plus a separate Travel root, each with a CAD total on 2025-01-15."""
+    operating = Account(name='Operating', type='Expense')
+    db.session.add(operating)
+    db.session.flush()
+    software = Account(name='Software', type='Expense', parent_id=operating.id)
+    db.session.add(software)
+    db.session.flush()
+    hosting = Account(name='Hosting', type='Expense', parent_id=software.id)
+    travel = Account(name='Travel', type='Expense')
+    db.session.add_all([hosting, travel, Currency(code='CAD', name='Canadian Dollar')])
+    db.session.flush()
+    for account, amount in ((operating, 1), (software, 10), (hosting, 100), (travel, 1000)):
+        db.session.add(DailyAccountTotal(account_id=account.id, day=date(2025, 1, 15), currency_code='CAD',
+                                         amount=Decimal(amount), amount_cad=Decimal(amount), count=1))
+    db.session.commit()
+    return operating, software
+
+
+def _expense_totals(client, query):
+    body = client.get(f'/reports/api/pl?range=custom&start=2025-01-01&end=2025-01-31&{query}').get_json()
+    return {item['name']: Decimal(item['total']) for item in body['expenses']}
+
+
+def test_pl_rolls_up_to_any_account(client):
+    operating, software = _expense_tree()
+
+    assert _expense_totals(client, f'rollup_to={software.id}') == {
+        'Operating': Decimal('1'), 'Software': Decimal('110'), 'Travel': Decimal('1000'),
+    }
+    assert _expense_totals(client, f'rollup_to={operating.id}') == {
+        'Operating': Decimal('111'), 'Travel': Decimal('1000'),
+    }
+    assert _expense_totals(client, 'rollup=1') == {'Operating': Decimal('111'), 'Travel': Decimal('1000')}
+    assert len(_expense_totals(client, '')) == 4